@@ -0,0 +1,136 @@
+from src.constants import CONFIG_NAME
+from src.detector import Detector
+from src.timing import timings, percentile
+from src.sources import openPath
+import argparse, configparser
+import json, time
+import tracemalloc
+
+# Offline benchmark of Detector.detect
+# Feeds a recorded clip or a directory of frames through the detector at maximum speed, no camera needed:
+#   python benchmark.py recording.mp4 --ground-truth recording.json
+# The ground truth file holds the expected number of nodes, either as {"nodes": N} or as a plain number.
+
+# Yield the frames of a source, at most limit frames
+def readFrames(source, limit=None):
+    read = 0
+    while limit is None or read < limit:
+        ret, frame = source.read()
+        if ret != True:
+            return
+        read += 1
+        yield frame
+
+def loadGroundTruth(path):
+    with open(path, "r") as truth_file:
+        text = truth_file.read().strip()
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return int(text)
+    if isinstance(value, dict):
+        return int(value["nodes"])
+    return int(value)
+
+# Run every frame through the detector and count the nodes
+def runBenchmark(args):
+    source = openPath(args.source, args.fps)
+    fps = source.fps
+    imW, imH = source.width, source.height
+    detector = Detector.fromConfig(args.config, imW, imH, num_threads=args.threads, delegate=args.delegate, fps=fps)
+
+    # Timing pass, only the detect calls are timed so decoding the recording does not count.
+    # Every sample is kept so the percentiles are exact.
+    timings.reset(keep_samples=True)
+    frames = 0
+    elapsed = 0.0
+    samples = [] # Latency of every detect call in milliseconds
+    nodes = 0
+    previous = 0
+    base = time.monotonic()
+    for frame in readFrames(source, args.frames):
+        start = time.perf_counter()
+        detector.detect(frame, draw=args.draw, timestamp=base + frames / fps)
+        samples.append((time.perf_counter() - start) * 1000)
+        elapsed += samples[-1] / 1000
+        frames += 1
+        if detector.count > previous:
+            nodes += detector.count - previous
+        previous = detector.count
+
+    stages = timings.snapshot()
+    timings.reset()
+
+    # Allocation pass, tracemalloc slows everything down so it runs apart from the timing pass (and is not timed)
+    source.release()
+    source = openPath(args.source, args.fps)
+    allocated = []
+    tracemalloc.start()
+    for frame in readFrames(source, args.alloc_frames):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        detector.detect(frame, draw=args.draw)
+        allocated.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    source.release()
+    timings.reset()
+
+    report = {
+        "source": args.source,
+        "frames": frames,
+        "resolution": [imW, imH],
+        "num_threads": detector.num_threads,
+        "delegate": detector.delegate,
+        "fps": frames / elapsed if elapsed > 0 else None,
+        "frame_ms": {"p50": percentile(samples, 50), "p95": percentile(samples, 95), "p99": percentile(samples, 99)},
+        "stages": stages,
+        "allocated_bytes_per_frame": sum(allocated) / len(allocated) if allocated else None,
+        "nodes": nodes
+    }
+    if args.ground_truth is not None:
+        expected = loadGroundTruth(args.ground_truth)
+        report["expected_nodes"] = expected
+        report["node_error"] = nodes - expected
+        report["node_accuracy"] = 1 - abs(nodes - expected) / expected if expected else None
+    return report
+
+def printReport(report):
+    print("Source: {} ({} frames, {}x{})".format(report["source"], report["frames"], *report["resolution"]))
+    print("Interpreter: num_threads={}, delegate={}".format(report["num_threads"], report["delegate"]))
+    if report["fps"] is None:
+        print("FPS: n/a, no frames were read")
+        return
+    print("FPS: {:.2f}".format(report["fps"]))
+    print("Frame latency: p50={:.2f}ms p95={:.2f}ms p99={:.2f}ms".format(
+        report["frame_ms"]["p50"], report["frame_ms"]["p95"], report["frame_ms"]["p99"]))
+    for stage, stats in report["stages"].items():
+        print("  {:<12} n={} p50={:.2f}ms p95={:.2f}ms p99={:.2f}ms mean={:.2f}ms".format(
+            stage, stats["count"], stats["p50_ms"], stats["p95_ms"], stats["p99_ms"], stats["mean_ms"]))
+    if report["allocated_bytes_per_frame"] is not None:
+        print("Allocated per frame: {:.0f} bytes".format(report["allocated_bytes_per_frame"]))
+    print("Nodes counted: {}".format(report["nodes"]))
+    if "expected_nodes" in report:
+        print("Nodes expected: {} (error {:+d})".format(report["expected_nodes"], report["node_error"]))
+
+
+if __name__=="__main__":
+    config = configparser.ConfigParser()
+    config.read(CONFIG_NAME)
+    parser = argparse.ArgumentParser(description="Benchmark Detector.detect on a recorded video or a directory of frames.")
+    parser.add_argument("source", help="video file or directory of images")
+    parser.add_argument("--ground-truth", help="file with the expected number of nodes")
+    parser.add_argument("--frames", type=int, default=None, help="maximum number of frames")
+    parser.add_argument("--fps", type=float, default=30.0, help="frame rate of an image directory")
+    parser.add_argument("--threads", default=config.get("DETECTION", "NUM_THREADS", fallback="auto"))
+    parser.add_argument("--delegate", default=config.get("DETECTION", "DELEGATE", fallback="xnnpack"))
+    parser.add_argument("--draw", action="store_true", help="draw the overlay as the GUI does")
+    parser.add_argument("--alloc-frames", type=int, default=20, help="frames measured for allocations")
+    parser.add_argument("--json", help="write the report to this JSON file")
+    args = parser.parse_args()
+    args.config = config
+
+    report = runBenchmark(args)
+    printReport(report)
+    if args.json is not None:
+        with open(args.json, "w") as json_file:
+            json.dump(report, json_file, indent=4)
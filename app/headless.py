@@ -0,0 +1,90 @@
+from src.constants import CONFIG_NAME
+from src.database import NodesDB
+from src.detector import Detector
+from src.grabber import FrameGrabber
+from src.pipeline import Pipeline
+from src.sources import openSource
+from src.counter import NodeCounter, sendCommand
+from datetime import datetime
+import serial
+import logging, configparser
+import signal, sys
+
+# Headless detection service
+# Runs capture -> detect -> count -> actuate -> persist without Qt, for unattended line machines:
+#   python headless.py
+class HeadlessService:
+
+    # Constructor
+    def __init__(self):
+        self.config = configparser.ConfigParser()
+        self.config.read(CONFIG_NAME)
+        self.count_thresh = self.config.getint("DETECTION", "COUNT_THRESH")
+
+        # Load database
+        self.db = NodesDB.fromConfig(self.config)
+        self.total = self.db.total() # Cached, only this service adds rows
+
+        # Serial port connection
+        self.ser_com = None
+        try:
+            self.ser_com = serial.Serial(self.config.get("SERIAL", "COM"))
+        except serial.SerialException as error:
+            logging.error("Error encountered {}".format(error))
+
+        self.source = openSource(self.config)
+        self.detector = Detector.fromConfig(self.config, self.source.width, self.source.height, fps=self.source.fps)
+        self.counter = NodeCounter(self.count_thresh, send=self.sendData, save=self.saveNode, reset=self.resetCount)
+
+        self.grabber = FrameGrabber(self.source)
+        self.pipeline = Pipeline()
+        self.pipeline.add("grabber", self.grabber)
+        self.pipeline.add("inferencer", self.infer)
+
+    # Inferencer stage: detect and count without drawing on the frame
+    def infer(self, frame):
+        self.grabber.consume(frame)
+        self.detector.detect(frame.image, draw=False, timestamp=frame.timestamp)
+        self.counter.update(self.detector.count, self.detector.count_timestamp)
+
+    def sendData(self, code):
+        return sendCommand(self.ser_com, code)
+
+    # Save a bundle in the database
+    def saveNode(self):
+        self.total += 1
+        self.db.add(data=self.total, date_time=datetime.now(), count_thresh=self.count_thresh)
+
+    def resetCount(self, initial=0):
+        self.detector.count = initial
+
+    # Run until SIGINT, SIGTERM, the end of the source or a failed stage.
+    # Returns the exit status, non-zero when a stage failed so a supervisor restarts the service.
+    def run(self):
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stop())
+        logging.info("Headless detection started")
+        self.pipeline.start()
+        # Join with a timeout so the main thread keeps handling signals.
+        # Once any stage has stopped the service is over, the others are given a moment to finish.
+        while all(stage.is_alive() for stage in self.pipeline.stages):
+            self.pipeline.stages[0].join(0.5)
+        self.pipeline.join(5)
+        self.pipeline.stop()
+        self.source.release()
+        self.db.close()
+        if self.ser_com is not None:
+            self.ser_com.close()
+        failures = self.pipeline.failures()
+        if failures:
+            logging.error("Headless detection stopped, failed stages: {}".format(", ".join(stage.name for stage in failures)))
+            return 1
+        logging.info("Headless detection stopped")
+        return 0
+
+    def stop(self):
+        self.pipeline.stop()
+
+
+if __name__=="__main__":
+    sys.exit(HeadlessService().run())
@@ -0,0 +1,136 @@
+import numpy as np
+import threading
+import os
+
+ARCHIVE_COLUMNS = ("detected_node_id", "data", "date_time", "count_thresh")
+
+# Detected Node Archive Class
+# Rows moved out of the live detected_node table, kept as one compressed columnar file per month
+# (numpy .npz, one array per column) in the archive directory. Files are rewritten whole
+# through a temporary file, so a crash never leaves a half written month behind.
+# The directory is only created with the first archived month.
+# Rows are added by the writer thread and read by the GUI thread, the in memory state is guarded by lock.
+class NodesArchive:
+
+    # Constructor
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.cache = {} # Columns of the months read last
+        # Number of rows and highest ID of every month, only the ID column is read
+        self.counts = {}
+        self.last_ids = {}
+        for month in self.months():
+            ids = self.read(month, ("detected_node_id",))["detected_node_id"]
+            self.counts[month] = len(ids)
+            self.last_ids[month] = int(ids.max()) if len(ids) else 0
+
+    def fileName(self, month):
+        return os.path.join(self.path, "detected_node-{}.npz".format(month))
+
+    # Archived months as "YYYY-MM", in time order
+    def months(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name[len("detected_node-"):-len(".npz")] for name in os.listdir(self.path)
+                      if name.startswith("detected_node-") and name.endswith(".npz"))
+
+    def read(self, month, columns=ARCHIVE_COLUMNS):
+        with np.load(self.fileName(month)) as archive:
+            return {column: archive[column] for column in columns}
+
+    # Columns of a month, the two months read last are kept in memory
+    def load(self, month):
+        with self.lock:
+            columns = self.cache.get(month)
+            if columns is None:
+                if len(self.cache) >= 2:
+                    self.cache.pop(next(iter(self.cache)))
+                columns = self.cache[month] = self.read(month)
+            return columns
+
+    # Replace the file of a month. Readers keep using the previous file until the state is swapped.
+    def write(self, month, columns):
+        os.makedirs(self.path, exist_ok=True)
+        temporary = self.fileName(month) + ".tmp"
+        with open(temporary, "wb") as archive_file:
+            np.savez_compressed(archive_file, **columns)
+            archive_file.flush()
+            os.fsync(archive_file.fileno())
+        with self.lock:
+            os.replace(temporary, self.fileName(month))
+            self.cache.pop(month, None)
+            self.counts[month] = len(columns["detected_node_id"])
+            self.last_ids[month] = int(columns["detected_node_id"].max())
+
+    # Add (detected_node_id, data, date_time, count_thresh) rows to their monthly files.
+    # Rows already archived (same ID and date and time) are kept once, so archiving the same rows again is harmless.
+    def add(self, rows):
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row[2].strftime("%Y-%m"), []).append(row)
+        for month, month_rows in by_month.items():
+            ids, data, date_times, count_thresh = zip(*month_rows)
+            columns = {
+                "detected_node_id": np.array(ids, dtype=np.int64),
+                "data": np.array(data, dtype=np.int64),
+                "date_time": np.array(date_times, dtype="datetime64[us]"),
+                "count_thresh": np.array(count_thresh, dtype=np.int64)
+            }
+            with self.lock:
+                archived = self.load(month) if month in self.counts else None
+            if archived is not None:
+                columns = {column: np.concatenate([archived[column], columns[column]]) for column in ARCHIVE_COLUMNS}
+            keys = np.empty(len(columns["detected_node_id"]), dtype=[("id", np.int64), ("date_time", "datetime64[us]")])
+            keys["id"] = columns["detected_node_id"]
+            keys["date_time"] = columns["date_time"]
+            _, unique = np.unique(keys, return_index=True) # Sorted by ID
+            self.write(month, {column: values[unique] for column, values in columns.items()})
+
+    # Months that may hold rows from start (inclusive) to end (exclusive)
+    def monthsIn(self, start=None, end=None):
+        with self.lock:
+            months = sorted(self.counts)
+        return [month for month in months
+                if (start is None or month >= start.strftime("%Y-%m")) and (end is None or month <= end.strftime("%Y-%m"))]
+
+    # Mask of the rows of a month in the time range
+    def mask(self, columns, start=None, end=None):
+        mask = np.ones(len(columns["detected_node_id"]), dtype=bool)
+        if start is not None:
+            mask &= columns["date_time"] >= np.datetime64(start)
+        if end is not None:
+            mask &= columns["date_time"] < np.datetime64(end)
+        return mask
+
+    # Up to limit archived rows after the row with ID after_id in the time range,
+    # as (detected_node_id, data, date_time, count_thresh) tuples ordered by ID
+    def rows(self, after_id=0, limit=None, start=None, end=None):
+        rows = []
+        with self.lock:
+            last_ids = dict(self.last_ids)
+        for month in self.monthsIn(start, end):
+            if last_ids.get(month, 0) <= after_id:
+                continue
+            columns = self.load(month)
+            mask = self.mask(columns, start, end) & (columns["detected_node_id"] > after_id)
+            rows.extend(zip(*(columns[column][mask].tolist() for column in ARCHIVE_COLUMNS)))
+            if limit is not None and len(rows) >= limit:
+                break
+        rows.sort()
+        return rows[:limit]
+
+    # Number of archived rows in the time range
+    def count(self, start=None, end=None):
+        if start is None and end is None:
+            return self.total()
+        return sum(int(np.count_nonzero(self.mask(self.load(month), start, end))) for month in self.monthsIn(start, end))
+
+    # Highest archived ID
+    def lastId(self):
+        with self.lock:
+            return max(self.last_ids.values(), default=0)
+
+    def total(self):
+        with self.lock:
+            return sum(self.counts.values())
@@ -4,10 +4,13 @@ from PyQt5.QtWidgets import (
     QWidget, QDesktopWidget
 )
 from PyQt5.QtGui import QIcon
+from PyQt5.QtCore import pyqtSignal
 
 # Camera View Widget Class
 class CameraView(QWidget):
-    
+
+    visibilityChanged = pyqtSignal(bool)
+
     # Constructor
     def __init__(self, parent=None):
         super(CameraView, self).__init__(parent)
@@ -27,6 +30,7 @@ class CameraView(QWidget):
 
         # ----- Widgets -----
         self.detection_status = QLabel("DETECTION STATUS: STOP")
+        self.model_status = QLabel("MODEL: LOADING")
         self.camera_frame = QLabel()
         self.start_detect_btn = QPushButton("START")
         self.stop_detect_btn = QPushButton("STOP")
@@ -36,6 +40,7 @@ class CameraView(QWidget):
         self.start_detect_btn.setStyleSheet("QPushButton {background-color:#62b4cf; border-radius: 7px; font-size:14px; font-weight:bold;} QPushButton:hover {background-color: #0080ff;}")
         self.stop_detect_btn.setStyleSheet("QPushButton {background-color:#ff6262; border-radius: 7px; font-size:14px; font-weight:bold;} QPushButton:hover {background-color: #ff1a1a;}")
         self.detection_status.setStyleSheet("QLabel {font-size:16px; font-weight:bold;} ")
+        self.model_status.setStyleSheet("QLabel {font-size:16px; font-weight:bold;} ")
         
 
         self.camera_frame.setMinimumSize(320, 240)
@@ -46,14 +51,27 @@ class CameraView(QWidget):
         #machinelayout.addWidget(self.off_btn)
         self.vlayout.addWidget(self.camera_frame)
         self.vlayout.addWidget(self.detection_status)
+        self.vlayout.addWidget(self.model_status)
         self.vlayout.addLayout(actionsLayout)
         #self.vlayout.addLayout(machinelayout)
         self.setLayout(self.vlayout)
         self.resize(self.vlayout.sizeHint())
 
+    # Tell whether the view is visible, so frames are only rendered while somebody is watching
+    def showEvent(self, event):
+        super(CameraView, self).showEvent(event)
+        self.visibilityChanged.emit(True)
+
+    def hideEvent(self, event):
+        super(CameraView, self).hideEvent(event)
+        self.visibilityChanged.emit(False)
+
     def setDetectionStatus(self, status):
         self.detection_status.setText("DETECTION STATUS: " + status)
 
+    def setModelStatus(self, status):
+        self.model_status.setText("MODEL: " + status)
+
     def center_Ui(self):
         qtRectangle = self.frameGeometry()
         centerPoint = QDesktopWidget().availableGeometry().center()
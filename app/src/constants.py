@@ -5,6 +5,8 @@ MODEL_NAME = "nodes"
 GRAPH_NAME = "detect.tflite"
 LABELMAP_NAME = "labelmap.txt"
 CONFIG_NAME = "config.ini"
+PROBE_CACHE_NAME = "probe_cache.json"
+TIMINGS_NAME = "timings.json"
 min_conf_threshold = float(0.5)
 # Path to .tflite file, which contains the model that is used for object detection
 PATH_TO_CKPT = os.path.join(CWD_PATH,MODEL_NAME,GRAPH_NAME)
@@ -0,0 +1,67 @@
+from .timing import timings
+import serial
+import logging
+import time
+
+# Serial command codes understood by the Arduino
+CUT = 1
+CONVEYOR_ON = 2
+CONVEYOR_OFF = 3
+
+# Send a command code through the serial port
+def sendCommand(ser_com, code):
+    try:
+        ser_com.write((code).to_bytes(1, 'little'))
+        return True
+    except serial.PortNotOpenError:
+        logging.error("Failed to send data. Not port detected.")
+    except AttributeError:
+        logging.error("Failed to send data. Not port detected.")
+    except serial.SerialException:
+        logging.error("Failed to send data. Not port detected.")
+    return False
+
+
+# Node counter
+# Turns the running node count of the detector into machine actions, without any GUI:
+# the conveyor runs while nodes are being counted, and once the count threshold is reached
+# the valve cuts the bundle, the bundle is saved and the count restarts.
+class NodeCounter:
+
+    # Constructor
+    # send(code) writes a command to the machine and returns True on success, save() persists a bundle
+    # and reset(initial) sets the detector count back to initial
+    def __init__(self, count_thresh, send, save, reset):
+        self.count_thresh = count_thresh
+        self.send = send
+        self.save = save
+        self.reset = reset
+
+        self.saved_once = False
+        self.conveyor_init = False
+
+    # Update with the current count, returns True when a bundle was saved.
+    # timestamp is the capture time (time.monotonic()) of the frame in which the count was reached,
+    # the time from that frame to the cut command leaving the serial port is recorded as detect_to_valve.
+    def update(self, count, timestamp=None):
+        if count > 0:
+            if self.conveyor_init == False:
+                self.send(CONVEYOR_ON)
+                self.conveyor_init = True
+        else:
+            if self.conveyor_init == True:
+                self.send(CONVEYOR_OFF)
+            self.conveyor_init = False
+        # If the number of detected nodes reaches its conditions
+        if count % (self.count_thresh+1) == 0 and count != 0:
+            if self.saved_once == False:
+                if self.send(CUT) and timestamp:
+                    timings.record("detect_to_valve", time.monotonic() - timestamp)
+                self.save()
+                self.saved_once = True # Set saved_once to True to perform tasks once
+                self.reset(1)
+                return True
+        else:
+            if self.saved_once == True:
+                self.saved_once = False
+        return False
@@ -1,27 +1,277 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, func
 from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable, CreateIndex
 from .tables import *
+from .writer import NodesWriter
+from .rollups import Rollups, PERIODS
+from .archive import NodesArchive, ARCHIVE_COLUMNS
+from datetime import datetime, time, timedelta
+import logging
+
+# SQLite connection profile, applied with PRAGMAs on every new connection.
+# WAL lets the readers (GUI, reports) run while the writer thread commits, and with WAL
+# synchronous=NORMAL only syncs at checkpoints instead of on every commit, which matters on SD cards.
+PRAGMA_PROFILE = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "mmap_size": 64 * 1024 * 1024, # Bytes of the database file read through memory mapping
+    "cache_size": -8000, # Negative values are KiB, about 8 MB of page cache
+    "busy_timeout": 5000 # Milliseconds to wait for a lock instead of failing
+}
+
+# One engine per database file, shared by every NodesDB and thread of the process
+engines = {}
+
+# Get the shared engine of a database file, created with the PRAGMA profile on first use
+def getEngine(db_name, profile=None):
+    engine = engines.get(db_name)
+    if engine is None:
+        profile = dict(PRAGMA_PROFILE, **(profile or {}))
+        engine = create_engine('sqlite:///{db_name}.db'.format(db_name=db_name), connect_args={"check_same_thread": False})
+
+        @event.listens_for(engine, "connect")
+        def applyProfile(connection, record):
+            cursor = connection.cursor()
+            for pragma, value in profile.items():
+                cursor.execute("PRAGMA {}={}".format(pragma, value))
+            journal_mode = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+            if journal_mode.lower() != str(profile["journal_mode"]).lower():
+                logging.warning("SQLite journal mode {} requested, using {}".format(profile["journal_mode"], journal_mode))
+            cursor.close()
+
+        engines[db_name] = engine
+    return engine
 
 # Database handler class
 class NodesDB(object):
 
     # Constructor
-    def __init__(self, db_name):
-        self.engine = create_engine('sqlite:///{db_name}.db'.format(db_name=db_name))
+    # Rows are written by a NodesWriter thread, in batches of batch_size rows or every batch_interval seconds.
+    # profile overrides entries of PRAGMA_PROFILE, shifts and rollup_max_interval configure the rollups (see Rollups).
+    # Rows older than retention_days (0 keeps them all) are moved to the monthly files in archive_path (see NodesArchive),
+    # at startup and every retention_interval seconds, then up to vacuum_pages free pages are returned to the file system.
+    def __init__(self, db_name, batch_size=20, batch_interval=0.5, queue_size=1000, profile=None, shifts=None, rollup_max_interval=600,
+                 retention_days=0, archive_path="archive", retention_interval=3600, vacuum_pages=1000):
+        # Connections are used by the GUI thread and the writer thread, each through its own session
+        self.engine = getEngine(db_name, profile)
+        if retention_days:
+            self.enableIncrementalVacuum() # Only retention frees pages, the one-time VACUUM is not worth it otherwise
         base.metadata.create_all(self.engine)
+        # create_all skips the indexes of tables that already exist
+        for index in DetectedNode.__table__.indexes:
+            index.create(self.engine, checkfirst=True)
+        self.archive = NodesArchive(archive_path)
+        self.keepIdsMonotonic()
         self.session = Session(self.engine)
+        self.rows = self.session.query(DetectedNode).count() # Committed rows, kept up to date by the writer
+        self.archived = self.archive.total() # Archived rows, updated together with rows
+        self.retention_days = retention_days
+        self.vacuum_pages = vacuum_pages
 
-    # Insert a new row 
-    def add(self, **kwargs):
-        detected_node = DetectedNode(**kwargs)
-        self.session.add(detected_node)
+        # Production rollups, built from the existing rows the first time
+        self.rollups = Rollups(shifts, rollup_max_interval)
+        if self.rows and not self.session.query(ProductionRollup).first():
+            self.rollups.rebuild(self.session)
+        self.rollups.last = self.session.query(func.max(DetectedNode.date_time)).scalar()
         self.session.commit()
+
+        self.writer = NodesWriter(self.engine, batch_size, batch_interval, queue_size, prepare=self.rollups.update, written=self.written,
+                                  maintain=self.retain, maintain_interval=retention_interval)
+        self.retain()
+        self.writer.start()
+
+    # Build the database from the [DATABASE] section of the config
+    @classmethod
+    def fromConfig(cls, config):
+        return cls(config.get("DATABASE", "NAME"),
+                   batch_size=config.getint("DATABASE", "BATCH_SIZE", fallback=20),
+                   batch_interval=config.getint("DATABASE", "BATCH_INTERVAL_MS", fallback=500) / 1000,
+                   queue_size=config.getint("DATABASE", "QUEUE_SIZE", fallback=1000),
+                   profile={pragma: config.get("DATABASE", pragma) for pragma in PRAGMA_PROFILE if config.has_option("DATABASE", pragma)},
+                   shifts={name: time.fromisoformat(start.strip()) for name, start in config.items("SHIFTS")} if config.has_section("SHIFTS") else None,
+                   rollup_max_interval=config.getfloat("DATABASE", "ROLLUP_MAX_INTERVAL", fallback=600),
+                   retention_days=config.getint("RETENTION", "DAYS", fallback=0),
+                   archive_path=config.get("RETENTION", "PATH", fallback="archive"),
+                   retention_interval=config.getint("RETENTION", "INTERVAL_MIN", fallback=60) * 60,
+                   vacuum_pages=config.getint("RETENTION", "VACUUM_PAGES", fallback=1000))
+
+    # Insert a new row, queued for the writer thread
+    def add(self, **kwargs):
+        self.writer.put(kwargs)
+
+    # Called by the writer thread with every committed batch
+    def written(self, batch):
+        self.rows += len(batch)
+        self.rollups.written()
+
+    # Number of added rows the writer has not committed yet
+    def pending(self):
+        with self.writer.lock:
+            return self.writer.pending
+
+    # Wait until every added row is in the database
+    def flush(self):
+        self.writer.flush()
+
+    # Write the pending rows and stop the writer
+    def close(self):
+        self.writer.close()
         self.session.close()
 
-    # Get all rows
-    def getall(self):
-        return self.session.query(DetectedNode).all()
+    # Queue depth and commit statistics of the writer
+    def stats(self):
+        return dict(self.writer.stats(), live=self.rows, archived=self.archived)
+
+    # Switch the database to incremental auto vacuum. An existing database needs a full VACUUM once to change mode.
+    def enableIncrementalVacuum(self):
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                logging.info("Enabling incremental vacuum, rebuilding the database once")
+                cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                cursor.execute("VACUUM")
+            cursor.close()
+        finally:
+            connection.close()
+
+    # Make the detected_node IDs monotonic so archived IDs are never handed out again, keyset pages rely on it.
+    # A table created without AUTOINCREMENT is rebuilt once, then the sequence is raised past the archived IDs.
+    def keepIdsMonotonic(self):
+        table = DetectedNode.__table__
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("BEGIN")
+            sql = cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table.name,)).fetchone()[0]
+            if "AUTOINCREMENT" not in sql.upper():
+                logging.info("Rebuilding {} with AUTOINCREMENT IDs".format(table.name))
+                cursor.execute("ALTER TABLE {0} RENAME TO {0}_old".format(table.name))
+                for index in table.indexes:
+                    cursor.execute("DROP INDEX IF EXISTS {}".format(index.name))
+                cursor.execute(str(CreateTable(table).compile(dialect=self.engine.dialect)))
+                for index in table.indexes:
+                    cursor.execute(str(CreateIndex(index).compile(dialect=self.engine.dialect)))
+                columns = ", ".join(column.name for column in table.columns)
+                cursor.execute("INSERT INTO {0} ({1}) SELECT {1} FROM {0}_old".format(table.name, columns))
+                cursor.execute("DROP TABLE {}_old".format(table.name))
+            last_id = self.archive.lastId()
+            sequence = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name=?", (table.name,)).fetchone()
+            if sequence is None:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table.name, last_id))
+            elif sequence[0] < last_id:
+                cursor.execute("UPDATE sqlite_sequence SET seq=? WHERE name=?", (last_id, table.name))
+            connection.commit()
+            cursor.close()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    # Move the rows older than the retention window to the archive, then vacuum incrementally.
+    # The archive files are written before the rows are deleted, a crash in between only archives the rows again.
+    # Returns the number of archived rows.
+    def retain(self, now=None, chunk=1000):
+        if not self.retention_days:
+            return 0
+        cutoff = (now or datetime.now()) - timedelta(days=self.retention_days)
+        session = Session(self.engine) # Runs on the writer thread at runtime
+        archived = 0
+        try:
+            while True:
+                rows = [tuple(row) for row in session.query(DetectedNode.detected_node_id, DetectedNode.data, DetectedNode.date_time, DetectedNode.count_thresh)
+                        .filter(DetectedNode.date_time < cutoff).order_by(DetectedNode.detected_node_id).limit(chunk)]
+                if not rows:
+                    break
+                self.archive.add(rows)
+                # The chunk is exactly the rows before the cutoff up to its last ID, deleted by range so the number of
+                # SQL variables stays fixed (SQLite before 3.32 allows 999)
+                session.query(DetectedNode).filter(DetectedNode.detected_node_id <= rows[-1][0], DetectedNode.date_time < cutoff) \
+                    .delete(synchronize_session=False)
+                session.commit()
+                with self.writer.lock:
+                    self.rows -= len(rows)
+                    self.archived = self.archive.total()
+                archived += len(rows)
+        finally:
+            session.close()
+
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("PRAGMA incremental_vacuum({})".format(self.vacuum_pages)).fetchall() # Every step frees a page
+            cursor.close()
+        finally:
+            connection.close()
+        if archived:
+            logging.info("Archived {} rows older than {}".format(archived, cutoff))
+        return archived
+
+    # Get all rows, optionally only those saved from start (inclusive) to end (exclusive).
+    # Archived rows are returned as DetectedNode objects too, not attached to the session.
+    def getall(self, start=None, end=None):
+        live = self.filter(self.session.query(DetectedNode), start, end).all()
+        live_ids = {node.detected_node_id for node in live} # A row being archived is in both for a moment
+        archived = [DetectedNode(**dict(zip(ARCHIVE_COLUMNS, row))) for row in self.archive.rows(start=start, end=end) if row[0] not in live_ids]
+        return archived + live
 
-    # Get the total number of rows
+    # Restrict a query to the rows saved from start (inclusive) to end (exclusive), either bound may be None
+    def filter(self, query, start=None, end=None):
+        if start is not None:
+            query = query.filter(DetectedNode.date_time >= start)
+        if end is not None:
+            query = query.filter(DetectedNode.date_time < end)
+        return query
+
+    # Get up to limit rows after the row with ID after_id, as (detected_node_id, data, date_time, count_thresh) tuples.
+    # Keyset pagination: pass the ID of the last row of a page to get the next one,
+    # every page is an index seek on the primary key however deep it is. Archived rows come first.
+    def page(self, after_id=0, limit=200, start=None, end=None):
+        archived = self.archive.rows(after_id, limit, start, end)
+        query = self.session.query(DetectedNode.detected_node_id, DetectedNode.data, DetectedNode.date_time, DetectedNode.count_thresh)
+        query = self.filter(query.filter(DetectedNode.detected_node_id > after_id), start, end)
+        rows = [tuple(row) for row in query.order_by(DetectedNode.detected_node_id).limit(limit)]
+        self.session.commit() # End the read transaction so WAL checkpoints are not held back
+        if archived:
+            merged = []
+            for row in sorted(archived + rows):
+                if not merged or merged[-1][0] != row[0]: # A row being archived is in both for a moment
+                    merged.append(row)
+            rows = merged[:limit]
+        return rows
+
+    # Count the rows saved from start (inclusive) to end (exclusive), using the date_time index
+    def count(self, start=None, end=None):
+        if start is None and end is None:
+            return self.total()
+        count = self.filter(self.session.query(DetectedNode), start, end).count()
+        self.session.commit()
+        return count + self.archive.count(start, end)
+
+    # Get the total number of rows, archived ones and the rows still queued for the writer included.
+    # Cached, no query is run.
     def total(self):
-        return self.session.query(DetectedNode).count()
\ No newline at end of file
+        with self.writer.lock:
+            return self.archived + self.rows + self.writer.pending
+
+    # Production per period ("minute", "hour", "shift" or "day") for the periods starting from start (inclusive)
+    # to end (exclusive), read from the rollups. Returns dicts in time order, with the mean interval between bundles in seconds.
+    def production(self, period, start=None, end=None):
+        if period not in PERIODS:
+            raise ValueError("Unknown rollup period {}".format(period))
+        query = self.session.query(ProductionRollup).filter(ProductionRollup.period == period)
+        if start is not None:
+            query = query.filter(ProductionRollup.period_start >= start)
+        if end is not None:
+            query = query.filter(ProductionRollup.period_start < end)
+        production = [{
+            "start": rollup.period_start,
+            "label": rollup.label,
+            "bundles": rollup.bundles,
+            "nodes": rollup.nodes,
+            "count_thresh": rollup.count_thresh,
+            "mean_interval": rollup.interval_sum / rollup.interval_count if rollup.interval_count else None
+        } for rollup in query.order_by(ProductionRollup.period_start)]
+        self.session.commit()
+        return production
@@ -1,33 +1,128 @@
 from PyQt5.QtCore import (
-    QThread, pyqtSignal,
-    Qt
+    QThread, pyqtSignal
 )
 from PyQt5.QtGui import (
     QImage
 )
 from .detector import Detector
-import cv2
+from .pipeline import Pipeline
+from .grabber import FrameGrabber
+from .sources import openSource
+from .constants import CONFIG_NAME
+from .timing import timings
+import numpy as np
+import cv2, configparser, logging, time
+
+# Size of the frame shown in the camera view
+DISPLAY_WIDTH = 320
+DISPLAY_HEIGHT = 240
 
 class Detection(QThread):
-    
+
     isActive = False
-    updateFrame = pyqtSignal(QImage)
-    getCount = pyqtSignal(int)
+    updateFrame = pyqtSignal(QImage, float) # Frame and time.perf_counter() at emission
+    getCount = pyqtSignal(int, float) # Count and capture time of the frame in which it was reached
     updateStatus = pyqtSignal(bool)
-    detector = Detector(320, 320, 640, 480)
+    updateModelStatus = pyqtSignal(str)
+    detector = None
+    pipeline = None
+    grabber = None
+    rendering = False # True while the camera view is visible
+    last_render = 0.0
+    display_interval = 0.1 # Seconds between two rendered frames
+    display_bgr = None # Reusable display-sized buffers
+    display_rgb = None
 
+    # Runs the grabber, inferencer and presenter stages, each on its own thread,
+    # so that capturing frame N+1 overlaps the inference of frame N
     def run(self):
-        running = True
-        capture = cv2.VideoCapture(0)
-        while running == True:
-            ret, frame = capture.read()
-            if ret == True:
-                if self.isActive == True:
-                    frame = self.detector.detect(frame)
-                self.updateStatus.emit(self.detector.detected)
-                img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                #flipped_img = cv2.flip(img, 1)
-                qtformat_img = QImage(img.data,img.shape[1], img.shape[0], QImage.Format_RGB888)
-                qtformat_img_scaled = qtformat_img.scaled(320, 240, Qt.KeepAspectRatio)
-                self.updateFrame.emit(qtformat_img_scaled)
-                self.getCount.emit(self.detector.count)
\ No newline at end of file
+        self.config = configparser.ConfigParser()
+        self.config.read(CONFIG_NAME)
+        self.source = openSource(self.config)
+        self.display_interval = 1 / self.config.getfloat("DISPLAY", "FPS", fallback=10.0)
+        self.grabber = FrameGrabber(self.source)
+        self.pipeline = Pipeline()
+        self.pipeline.add("grabber", self.grabber)
+        self.pipeline.add("inferencer", self.infer)
+        self.pipeline.add("presenter", self.present)
+        self.pipeline.start()
+        self.loadDetector()
+        self.pipeline.join()
+        self.source.release()
+        if self.pipeline.failures():
+            self.updateModelStatus.emit("ERROR") # The stage error is in the log
+
+    # Build the detector on the worker thread while the camera is already running,
+    # so importing this module and opening the window do not wait for the model
+    def loadDetector(self):
+        self.updateModelStatus.emit("LOADING")
+        try:
+            # The detector geometry follows the frame source
+            self.detector = Detector.fromConfig(self.config, self.source.width, self.source.height, fps=self.source.fps)
+        except Exception as error:
+            logging.error("Failed to load the detection model. {}".format(error))
+            self.updateModelStatus.emit("ERROR")
+            return
+        self.updateModelStatus.emit("READY")
+
+    def stop(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+
+    # Enable or disable rendering, connected to the visibility of the camera view
+    def setRendering(self, rendering):
+        self.rendering = rendering
+
+    # True when a frame has to be rendered: somebody is watching and the display frame rate allows it
+    def renderDue(self):
+        if self.rendering == False:
+            return False
+        now = time.monotonic()
+        if now - self.last_render < self.display_interval:
+            return False
+        self.last_render = now
+        return True
+
+    # Inferencer stage: run the detector on the newest frame.
+    # Only the frames due for display are drawn on and passed to the presenter.
+    def infer(self, frame):
+        self.grabber.consume(frame) # Account dropped frames and the frame age
+        render = self.renderDue()
+        if self.detector is None:
+            return frame if render else None # Model still loading
+        if self.isActive == True:
+            frame.image = self.detector.detect(frame.image, draw=render, timestamp=frame.timestamp)
+        self.updateStatus.emit(self.detector.detected)
+        self.getCount.emit(self.detector.count, self.detector.count_timestamp)
+        return frame if render else None
+
+    # Presenter stage: convert the frame into a QImage for the camera view.
+    # The frame is first shrunk to display size with OpenCV into a reusable buffer, so the colour
+    # conversion only touches display-sized data (or is skipped entirely with Format_BGR888).
+    # The emitted QImage is a copy owned by Qt, it stays valid after the buffer is reused for the next frame.
+    def present(self, frame):
+        start = time.perf_counter()
+        height, width = frame.image.shape[:2]
+        scale = min(DISPLAY_WIDTH / width, DISPLAY_HEIGHT / height) # Keep the aspect ratio
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        if self.display_bgr is None or self.display_bgr.shape[:2] != (size[1], size[0]):
+            self.display_bgr = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            self.display_rgb = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        cv2.resize(frame.image, size, dst=self.display_bgr, interpolation=cv2.INTER_AREA)
+        #cv2.flip(self.display_bgr, 1, dst=self.display_bgr)
+        if hasattr(QImage, "Format_BGR888"): # Qt 5.14 and later
+            img, img_format = self.display_bgr, QImage.Format_BGR888
+        else:
+            img, img_format = cv2.cvtColor(self.display_bgr, cv2.COLOR_BGR2RGB, dst=self.display_rgb), QImage.Format_RGB888
+        qtformat_img = QImage(img.data, img.shape[1], img.shape[0], img.strides[0], img_format).copy()
+        emitted = time.perf_counter()
+        timings.record("qimage", emitted - start)
+        self.updateFrame.emit(qtformat_img, emitted)
+
+    # Queue depth and drop counts of every stage, plus the grabber frame ages
+    def stats(self):
+        if self.pipeline is None:
+            return {}
+        stats = self.pipeline.stats()
+        stats["grabber"].update(self.grabber.stats())
+        return stats
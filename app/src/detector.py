@@ -1,27 +1,33 @@
 from datetime import datetime, date
 from .constants import *
+from .postprocess import postprocess
+from .tracker import IouTracker
+from .overlay import OverlayRenderer
+from .timing import timings
 import numpy as np
-import cv2, sqlite3
+import cv2
 import logging
 import time
+import math
 
-logging.basicConfig(filename="app_log.log", level=logging.ERROR, format="%(asctime)s:%(levelname)s:%(message)s")
+logging.basicConfig(filename="app_log.log", level=logging.INFO, format="%(asctime)s:%(levelname)s:%(message)s")
 
-try:
-    from tflite_runtime.interpreter import Interpreter
-except ImportError:
-    logging.error("Encountered importing tflite\nTrying to import tensorflow")
-    try:
-        from tensorflow import lite
-    except ImportError:
-        print("Encountered importing tensorflow")
-        exit(1)
+from .interpreter import createInterpreter, probeThreads
 
 # Detector Class
 class Detector:
 
     # Constructor
-    def __init__(self, width, height, imW, imH):
+    # num_threads is a number of threads or "auto" to use the fastest one found by the thread probe,
+    # delegate is passed to createInterpreter.
+    # tracker is "iou" to count nodes with the IoU tracker (iou_thresh, max_age) or "none" for the
+    # single frame heuristic (a node is counted when exactly one box is in the ROI).
+    # skip runs the model on every Nth frame only and moves the tracks in between (needs the tracker),
+    # "auto" picks N from the measured invoke time and the source fps, up to max_skip.
+    # crop feeds the model only the vertical strip of the frame around the ROI lines, widened by crop_margin pixels
+    def __init__(self, width, height, imW, imH, num_threads="auto", delegate="xnnpack",
+                 tracker="iou", iou_thresh=0.3, max_age=5, skip=1, max_skip=4, fps=30.0,
+                 crop=False, crop_margin=100):
     
         self.detected = False
         self.isCounted = False
@@ -39,121 +45,187 @@ class Detector:
 
         # Initialize frame rate calculation
         self.frame_rate_calc = 1
-        self.freq = cv2.getTickFrequency()
 
         self.nodes = 0
         self.nodes_list = []
+        self.detections = None
+        self.overlay = None
+        self.count_timestamp = 0.0 # Capture time of the frame in which the count last went up
 
-        try:
-            self.interpreter = Interpreter(model_path=PATH_TO_CKPT)
-        except NameError:
-            logging.error("Error encountered creating self.interpreter based on tflite.")
-            try:
-                self.interpreter = lite.Interpreter(model_path=PATH_TO_CKPT)
-            except NameError:
-                logging.error("Failed to create self.interpreter based on tensorflow.")
-                exit(1)
-
-        self.interpreter.allocate_tensors()
+        if str(num_threads).strip().lower() == "auto":
+            num_threads = probeThreads(PATH_TO_CKPT, delegate)
+        self.num_threads = int(num_threads)
+        self.delegate = delegate
+        self.interpreter = createInterpreter(PATH_TO_CKPT, self.num_threads, self.delegate)
+        logging.info("Interpreter configuration: model={}, num_threads={}, delegate={}".format(PATH_TO_CKPT, self.num_threads, self.delegate))
 
         self.roi1 = int(imW/2-50)
         self.roi2 = int(self.roi1 + 100)
+
+        # Part of the frame given to the model, the whole frame or the strip around the ROI lines
+        self.crop_x0 = 0
+        self.crop_x1 = imW
+        if crop == True:
+            self.crop_x0 = max(0, self.roi1 - int(crop_margin))
+            self.crop_x1 = min(imW, self.roi2 + int(crop_margin))
+
+        self.tracker = None
+        if str(tracker).strip().lower() == "iou":
+            self.tracker = IouTracker(self.roi1, self.roi2, float(iou_thresh), int(max_age))
+        self.reset_tracker = False # Set from other threads, the tracks are dropped by the next detect
+
+        # Frame skipping
+        self.skip = str(skip).strip().lower()
+        self.max_skip = int(max_skip)
+        self.fps = float(fps)
+        self.invoke_time = 0.0 # Moving average of the invoke() time in seconds
+        self.frames_since_invoke = 0
         
         # Get model details
         self.input_details = self.interpreter.get_input_details()
         self.output_details = self.interpreter.get_output_details()
-        height = self.input_details[0]['shape'][1]
-        width = self.input_details[0]['shape'][2]
+        self.height = int(self.input_details[0]['shape'][1])
+        self.width = int(self.input_details[0]['shape'][2])
 
         self.floating_model = (self.input_details[0]['dtype'] == np.float32)
 
-        self.conn = sqlite3.connect("Nodesb.db")
-        self.c = self.conn.cursor()
+        # Preallocated input buffers, filled in place on every frame
+        self.input_index = self.input_details[0]['index']
+        self.resized = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.rgb = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.input_data = np.empty(self.input_details[0]['shape'], dtype=self.input_details[0]['dtype'])
+
+        # Write straight into the interpreter's input tensor when the runtime exposes a writable view,
+        # otherwise fill input_data and copy it with set_tensor
+        self.input_tensor = None
+        try:
+            view = self.interpreter.tensor(self.input_index)()
+            if view.flags.writeable and view.flags.c_contiguous and view.shape == self.input_data.shape:
+                self.input_tensor = self.interpreter.tensor(self.input_index)
+            del view # No reference to the tensor data may be held during invoke()
+        except (AttributeError, ValueError, RuntimeError) as error:
+            logging.error("Input tensor view not available, using set_tensor. {}".format(error))
 
         self.start_time = 0
         self.elapsed_time = 0
-        self.end_time = time.time() # Get the initial time when the application started, it will be used for the computation during runtime detection
+        self.end_time = time.monotonic() # Get the initial time when the application started, it will be used for the computation during runtime detection
         self.runtime_fade = False # This boolean variable will control the flow of elapsed time for counting
         self.interval = 5 # Number in seconds before resetting the count to zero
 
-    def detect(self, frame):
+    # Fill the model input from the BGR frame without allocating.
+    # The frame is resized first, so the colour conversion and normalization only touch model-sized data.
+    # When cropping, the strip is a view of the frame, it is not copied.
+    def prepare(self, frame):
+        if self.crop_x0 > 0 or self.crop_x1 < self.imW:
+            frame = frame[:, self.crop_x0:self.crop_x1]
+        cv2.resize(frame, (self.width, self.height), dst=self.resized)
+        if self.input_tensor is not None:
+            input_data = self.input_tensor()
+        else:
+            input_data = self.input_data
+        if self.floating_model:
+            # Normalize pixel values if using a floating model (i.e. if model is non-quantized)
+            cv2.cvtColor(self.resized, cv2.COLOR_BGR2RGB, dst=self.rgb)
+            np.subtract(self.rgb, input_mean, out=input_data[0])
+            np.divide(input_data[0], input_std, out=input_data[0])
+        else:
+            cv2.cvtColor(self.resized, cv2.COLOR_BGR2RGB, dst=input_data[0])
+        if self.input_tensor is None:
+            self.interpreter.set_tensor(self.input_index, input_data)
+        del input_data # Release the tensor view before invoke()
+
+    # Number of frames per model run, fixed or chosen from the invoke time so that
+    # the model runs about once per invoke time worth of source frames
+    def skipFrames(self):
+        if self.skip == "auto":
+            return max(1, min(self.max_skip, math.ceil(self.invoke_time * self.fps)))
+        return max(1, int(self.skip))
 
-        # Get the current time
-        self.start_time = time.time()
+    # True when the model is skipped on this frame
+    def skipFrame(self):
+        if self.frames_since_invoke + 1 < self.skipFrames():
+            self.frames_since_invoke += 1
+            return True
+        self.frames_since_invoke = 0
+        return False
+
+    # Run the detection on the frame and, if draw is True, draw the results on it (the frame is modified in place).
+    # timestamp is the time.monotonic() capture time of the frame, it is kept in count_timestamp when a node is counted.
+    def detect(self, frame, draw=True, timestamp=None):
+
+        # Get the current time, the capture time of the frame when it is known so that
+        # the count reset interval follows the frame clock (e.g. when replaying a recording)
+        self.start_time = timestamp if timestamp is not None else time.monotonic()
         
-        # Start timer (for calculating frame rate)
-        t1 = cv2.getTickCount()
+        # Start timer (for calculating frame rate and the stage latencies)
+        t1 = time.perf_counter()
+
+        if self.reset_tracker:
+            self.reset_tracker = False
+            if self.tracker is not None:
+                self.tracker.reset()
 
         today = date.today()
         now = datetime.now()
         _date = today.strftime("%d/%m/%Y")
         current_time = now.strftime("%H:%M:%S")
 
-        frame = frame.copy()
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame_resized = cv2.resize(frame_rgb, (self.width, self.height))
-        input_data = np.expand_dims(frame_resized, axis=0)
-        
-        # Insert content for detection...
-        # Normalize pixel values if using a floating model (i.e. if model is non-quantized)
-        if self.floating_model:
-            input_data = (np.float32(input_data) - input_mean) / input_std
+        if self.tracker is not None and self.skipFrame():
+            # Skipped frame, the tracks are moved to their predicted position instead of running the model
+            counted = self.tracker.predict(self.start_time)
+            detections = self.tracker.detections(self.imW, self.imH)
+            self.detections = detections[detections["in_roi"]]
+            timings.record("predict", time.perf_counter() - t1)
+        else:
+            # Insert content for detection...
+            self.prepare(frame)
+            t_prepared = time.perf_counter()
+            timings.record("preprocess", t_prepared - t1)
+
+            # Perform the actual detection by running the model with the image as input
+            self.interpreter.invoke()
+            t_invoked = time.perf_counter()
+            timings.record("invoke", t_invoked - t_prepared)
+            self.invoke_time = t_invoked - t_prepared if self.invoke_time == 0 else 0.9 * self.invoke_time + 0.1 * (t_invoked - t_prepared)
+
+            # Retrieve detection results
+            boxes = self.interpreter.get_tensor(self.output_details[1]['index'])[0] # Bounding box coordinates of detected objects
+            classes = self.interpreter.get_tensor(self.output_details[3]['index'])[0] # Class index of detected objects
+            scores = self.interpreter.get_tensor(self.output_details[0]['index'])[0] # Confidence of detected object
+
+            # Keep the detections above the minimum threshold, the tracker follows them over the whole frame
+            # while only the ones in between the ROI lines are shown
+            if self.tracker is not None:
+                detections = postprocess(boxes, classes, scores, self.imW, self.imH, self.roi1, self.roi2, min_conf_threshold,
+                                         roi_only=False, x0=self.crop_x0, cropW=self.crop_x1 - self.crop_x0)
+                counted = self.tracker.update(detections, self.start_time)
+                self.detections = detections[detections["in_roi"]]
+            else:
+                self.detections = postprocess(boxes, classes, scores, self.imW, self.imH, self.roi1, self.roi2, min_conf_threshold,
+                                              x0=self.crop_x0, cropW=self.crop_x1 - self.crop_x0)
+            timings.record("postprocess", time.perf_counter() - t_invoked)
+        detected_total = len(self.detections)
 
-        # Perform the actual detection by running the model with the image as input
-        self.interpreter.set_tensor(self.input_details[0]['index'],input_data)
-        self.interpreter.invoke()
-        
-        # Draw ROI line for counting.  
-        cv2.line(frame, (self.roi1, 0), (self.roi1, self.imH), (0, 0xFF, 0), 5)
-        cv2.line(frame, (self.roi2, 0), (self.roi2, self.imH), (0, 0xFF, 0), 5)
-        
-        # Retrieve detection results
-        boxes = self.interpreter.get_tensor(self.output_details[1]['index'])[0] # Bounding box coordinates of detected objects
-        classes = self.interpreter.get_tensor(self.output_details[3]['index'])[0] # Class index of detected objects
-        scores = self.interpreter.get_tensor(self.output_details[0]['index'])[0] # Confidence of detected object
-        
-        detected_total = 0
-        
-        # Loop over all detections and draw detection box if confidence is above minimum threshold
-        for i in range(len(scores)):
-            if ((scores[i] > min_conf_threshold) and (scores[i] <= 1.0)):
-                
-                # Get bounding box coordinates and draw box
-                # Interpreter can return coordinates that are outside of image dimensions, need to force them to be within image using max() and min()
-                ymin = int(max(1,(boxes[i][0] * self.imH)))
-                xmin = int(max(1,(boxes[i][1] * self.imW)))
-                ymax = int(min(self.imH,(boxes[i][2] * self.imH)))
-                xmax = int(min(self.imW,(boxes[i][3] * self.imW)))
-                
-                # In between ROI (Region of Interest)
-                if ((xmin > self.roi1) and (xmin < self.roi2)):
-                    detected_total += 1
-                    
-                    cv2.rectangle(frame, (xmin,ymin), (xmax,ymax), (10, 255, 0), 2)
-                    
-                    # Draw label
-                    object_name = self.labels[int(classes[i])] # Look up object name from "labels" array using class index
-                    label = '%s: %d%%' % (object_name, int(scores[i]*100)) # Example: 'person: 72%'
-                    labelSize, baseLine = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2) # Get font size
-                    label_ymin = max(ymin, labelSize[1] + 10) # Make sure not to draw label too close to top of window
-                    cv2.rectangle(frame, (xmin, label_ymin-labelSize[1]-10), (xmin+labelSize[0], label_ymin+baseLine-10), (255, 255, 255), cv2.FILLED) # Draw white box to put label text in
-                    cv2.putText(frame, label, (xmin, label_ymin-7), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2) # Draw label text
-                else:
-                    continue
-        
         # Set the runtime_fade to true by default
         self.runtime_fade = True
 
-        if detected_total == 1:
+        if self.tracker is not None:
+            # Every track is counted once, when it reaches the ROI band
+            self.detected = detected_total > 0
+            if self.detected == True:
+                self.runtime_fade = False
+            if counted > 0:
+                self.count += counted
+                self.count_timestamp = timestamp if timestamp is not None else time.monotonic()
+        elif detected_total == 1:
             self.runtime_fade = False # If there's a detected node, it will not run the elapsed_time
             self.detected = True
-            cv2.putText(frame,'{}'.format("NODE  DETECTED"), (30,450), cv2.FONT_HERSHEY_SIMPLEX, 1.8, (255,255,110), 4, cv2.LINE_AA)
             if self.isCounted == False:
                 self.count += 1
+                self.count_timestamp = timestamp if timestamp is not None else time.monotonic()
                 self.isCounted = True
         else:
             self.detected = False
-            cv2.putText(frame,'{}'.format("INVALID!  NOT NODE"), (30,450), cv2.FONT_HERSHEY_SIMPLEX, 1.8, (0,0,255), 4, cv2.LINE_AA)
             if self.isCounted == True:
                 self.isCounted = False
 
@@ -168,9 +240,16 @@ class Detector:
         # reset the count and elapsed_time to zero
         if self.elapsed_time >= self.interval:
             self.count = 0
+            if self.tracker is not None:
+                self.tracker.reset() # Stale tracks could absorb the next node
             self.elapsed_time = 0
             self.runtime_fade = False
 
+        if draw == True:
+            t_draw = time.perf_counter()
+            self.draw(frame)
+            timings.record("draw", time.perf_counter() - t_draw)
+
         # Draw framerate in corner of frame
         #cv2.putText(frame,'FPS: {0:.2f}'.format(self.frame_rate_calc),(30,50),cv2.FONT_HERSHEY_SIMPLEX,1,(255,255,0),2,cv2.LINE_AA)
 
@@ -178,12 +257,37 @@ class Detector:
         #cv2.putText(frame,'Time: {0:.8s}'.format(current_time),(30,210),cv2.FONT_HERSHEY_SIMPLEX,0.7,(255,255,0),2,cv2.LINE_AA)
 
         # Calculate framerate
-        t2 = cv2.getTickCount()
-        time1 = (t2-t1)/self.freq
+        t2 = time.perf_counter()
+        time1 = t2-t1
         self.frame_rate_calc= 1/time1
+        timings.record("detect", time1)
 
         # Set the old time
         self.end_time = self.start_time
 
         return frame
 
+    # Draw the ROI lines, the detections in between them and the detection status on the frame.
+    # The overlay renderer is only built the first time a frame is drawn.
+    def draw(self, frame):
+        if self.overlay is None:
+            self.overlay = OverlayRenderer(self.imW, self.imH, self.roi1, self.roi2, self.labels)
+        self.overlay.draw(frame, self.detections, self.detected)
+
+    # Build a detector for frames of imW x imH from the [DETECTION] section of the config,
+    # keyword arguments override the configured values (fps is the frame rate of the source)
+    @classmethod
+    def fromConfig(cls, config, imW, imH, **kwargs):
+        options = {
+            "num_threads": config.get("DETECTION", "NUM_THREADS", fallback="auto"),
+            "delegate": config.get("DETECTION", "DELEGATE", fallback="xnnpack"),
+            "tracker": config.get("DETECTION", "TRACKER", fallback="iou"),
+            "iou_thresh": config.getfloat("DETECTION", "IOU_THRESH", fallback=0.3),
+            "max_age": config.getint("DETECTION", "MAX_AGE", fallback=5),
+            "skip": config.get("DETECTION", "SKIP", fallback="1"),
+            "max_skip": config.getint("DETECTION", "MAX_SKIP", fallback=4),
+            "crop": config.getboolean("DETECTION", "CROP", fallback=False),
+            "crop_margin": config.getint("DETECTION", "CROP_MARGIN", fallback=100)
+        }
+        options.update(kwargs)
+        return cls(320, 320, imW, imH, **options)
@@ -0,0 +1,82 @@
+from .pipeline import END_OF_STREAM
+from .timing import timings
+import time
+
+# Captured frame with its sequence number and capture time
+class Frame:
+
+    __slots__ = ("index", "timestamp", "image")
+
+    # Constructor
+    def __init__(self, index, timestamp, image):
+        self.index = index
+        self.timestamp = timestamp # time.monotonic() right after the frame was read
+        self.image = image
+
+    # Seconds since the frame was captured
+    def age(self):
+        return time.monotonic() - self.timestamp
+
+
+# Frame grabber, used as the work function of the grabber stage.
+# capture is a cv2.VideoCapture or any FrameSource.
+# The stage calls it in a tight loop so the driver buffer is always drained and
+# only the newest frame waits in the slot queue (latest frame wins).
+class FrameGrabber:
+
+    # Constructor
+    # retry_delay is the pause in seconds after a failed read, so a failing device is not polled in a busy loop
+    def __init__(self, capture, retry_delay=0.01):
+        self.capture = capture
+        self.retry_delay = retry_delay
+        self.grabbed = 0
+        self.failed = 0
+
+        # Accounting on the consumer side
+        self.consumed = 0
+        self.dropped = 0
+        self.last_index = -1
+        self.last_age = 0.0
+        self.max_age = 0.0
+        self.total_age = 0.0
+
+    # Read the next frame from the device.
+    # Returns END_OF_STREAM once a source that can end (eof) has no frames left.
+    def __call__(self, item=None):
+        start = time.perf_counter()
+        ret, image = self.capture.read()
+        timings.record("grab", time.perf_counter() - start)
+        if ret != True:
+            if getattr(self.capture, "eof", False):
+                return END_OF_STREAM
+            self.failed += 1
+            time.sleep(self.retry_delay)
+            return None
+        frame = Frame(self.grabbed, time.monotonic(), image)
+        self.grabbed += 1
+        return frame
+
+    # Called by the consumer when it starts working on a frame.
+    # Frames skipped since the last consumed one are counted as dropped and the
+    # age of the frame is recorded.
+    def consume(self, frame):
+        if self.last_index >= 0:
+            self.dropped += max(0, frame.index - self.last_index - 1)
+        self.last_index = frame.index
+        self.consumed += 1
+        self.last_age = frame.age()
+        self.max_age = max(self.max_age, self.last_age)
+        self.total_age += self.last_age
+        return self.last_age
+
+    def stats(self):
+        mean_age = self.total_age / self.consumed if self.consumed else 0.0
+        return {
+            "grabbed": self.grabbed,
+            "failed": self.failed,
+            "consumed": self.consumed,
+            "dropped": self.dropped,
+            "last_age": self.last_age,
+            "mean_age": mean_age,
+            "max_age": self.max_age
+        }
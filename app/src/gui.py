@@ -2,8 +2,8 @@ from PyQt5.QtWidgets import (
     QMainWindow,
     QWidget, QPushButton,
     QHBoxLayout, QVBoxLayout,
-    QLabel, QTableWidget,
-    QTableWidgetItem, QAbstractScrollArea,
+    QLabel, QTableView,
+    QAbstractScrollArea,
     QAbstractItemView, QGroupBox,
     QLineEdit, QWidget, 
     QGridLayout, QMessageBox,
@@ -13,15 +13,19 @@ from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QPixmap, QIcon
 from datetime import datetime
 from src.database import NodesDB
+from src.models import DetectedNodeModel
 from src.detection import Detection
 from src.settings import SettingsView
 from src.camera import CameraView
-from src.constants import CONFIG_NAME
+from src.stats import StatsView
+from src.constants import CONFIG_NAME, TIMINGS_NAME
+from src.timing import timings
 from src.confirm import Confirm
 from src.response import MachineResponse
+from src.counter import NodeCounter, sendCommand, CUT, CONVEYOR_ON, CONVEYOR_OFF
 import serial, serial.tools.list_ports
 import logging, configparser
-import random
+import random, time
 
 # Main GUI of the Application
 class MainWindow(QMainWindow):
@@ -34,10 +38,11 @@ class MainWindow(QMainWindow):
         self.config.read(CONFIG_NAME)
 
         # Load database
-        self.db = NodesDB(self.config.get('DATABASE', 'NAME'))
+        self.db = NodesDB.fromConfig(self.config)
 
-        self.saved_once = False
-        self.conveyor_init = False
+        # Turns the detector count into machine actions and saved bundles
+        self.counter = NodeCounter(self.config.getint("DETECTION", "COUNT_THRESH"),
+                                   send=self.sendData, save=self.saveNode, reset=self.resetCount)
 
         self.machine_response = MachineResponse()
         self.machine_response.updateResponse.connect(self.updateResponse)
@@ -52,9 +57,9 @@ class MainWindow(QMainWindow):
 
         # Initialize detection
         self.detection = Detection()
-        self.detection.start()
         self.detection.updateFrame.connect(self.updateFrame)
         self.detection.getCount.connect(self.getCount)
+        self.detection.updateModelStatus.connect(self.updateModelStatus)
         
         # Initialize camera view widget
         self.camera_view = CameraView()
@@ -62,6 +67,7 @@ class MainWindow(QMainWindow):
         self.camera_view.stop_detect_btn.clicked.connect(self.stopProcess)
         self.camera_view.on_btn.clicked.connect(self.sendDataTwo)
         self.camera_view.off_btn.clicked.connect(self.sendDataThree)
+        self.camera_view.visibilityChanged.connect(self.detection.setRendering)
 
         # Initialize settings view widget
         self.settings_view = SettingsView()
@@ -69,11 +75,20 @@ class MainWindow(QMainWindow):
         self.settings_view.btn_cancel.clicked.connect(lambda: self.settings_view.close())
         self.settings_view.count_thresh_value.setCurrentText(str(self.config.getint("DETECTION", "COUNT_THRESH")))
 
+        # Initialize stats view widget
+        self.stats_view = StatsView()
+        self.stats_view.btn_refresh.clicked.connect(self.refreshStats)
+        self.stats_view.btn_export.clicked.connect(self.exportStats)
+        self.stats_view.btn_close.clicked.connect(lambda: self.stats_view.close())
+
         self.setup_UI()
 
         # Update serial connection status
         self.updateSerialConnect()
 
+        # Start the camera and load the detection model in the background
+        self.detection.start()
+
     # Close the other windows when the main window is closed
     def closeEvent(self, event):
         # Open up a confirmation dialog
@@ -82,7 +97,10 @@ class MainWindow(QMainWindow):
                           text="Are you sure you want exit?")
         answer = confirm.exec()
         if answer == QMessageBox.Yes:
+            self.detection.stop()
+            self.db.close() # Write the rows still queued
             self.camera_view.close()
+            self.stats_view.close()
             event.accept()
         else:
             self.show()
@@ -94,6 +112,7 @@ class MainWindow(QMainWindow):
         self.config.set("SERIAL", "COM", self.settings_view.port_value.currentText())
         with open(CONFIG_NAME, "w") as configfile:
             self.config.write(configfile)
+        self.counter.count_thresh = self.config.getint("DETECTION", "COUNT_THRESH")
         self.updateSerialConnect()
         self.settings_view.close()
 
@@ -141,6 +160,11 @@ class MainWindow(QMainWindow):
             response = "CONVEYOR OFF"
         self.machine_response_value.setText(response)
 
+    # Update the detection model status (LOADING, READY or ERROR)
+    def updateModelStatus(self, status):
+        self.model_status_value.setText(status)
+        self.camera_view.setModelStatus(status)
+
     # Open settings view widget
     def openSettingsView(self):
         ports = serial.tools.list_ports.comports(include_links=False)
@@ -164,8 +188,30 @@ class MainWindow(QMainWindow):
         self.camera_view.center_Ui()
         self.camera_view.show()
 
+    # Open stats view widget
+    def openStatsView(self):
+        self.refreshStats()
+        self.stats_view.center_Ui()
+        self.stats_view.show()
+
+    # Show the stage latencies and the pipeline counters in the stats view
+    def refreshStats(self):
+        lines = ["STAGE LATENCIES", timings.summary(), "", "PIPELINE"]
+        for stage, stats in self.detection.stats().items():
+            lines.append("{}: {}".format(stage, ", ".join("{}={}".format(key, value) for key, value in stats.items())))
+        lines += ["", "DATABASE", ", ".join("{}={}".format(key, value) for key, value in self.db.stats().items())]
+        self.stats_view.setStats("\n".join(lines))
+
+    # Export the stage latency histograms as JSON
+    def exportStats(self):
+        try:
+            timings.toJson(TIMINGS_NAME)
+        except OSError as error:
+            logging.error("Failed to export timings. {}".format(error))
+
     # Update frame in the camera view
-    def updateFrame(self, frame):
+    def updateFrame(self, frame, emitted):
+        timings.record("signal", time.perf_counter() - emitted) # Signal delivery from the presenter thread
         self.camera_view.camera_frame.setPixmap(QPixmap.fromImage(frame))
 
     # Set up Ui
@@ -212,22 +258,16 @@ class MainWindow(QMainWindow):
         # ----- Table actions layout -----
         self.tableActionsLayout = QHBoxLayout()
 
-        # ----- Table widget -----
-        table_headers = {
-            "data": "Data",
-            "date": "Date",
-            "time": "Time",
-            "thresh": "Threshold"
-        }
-        self.table = QTableWidget()
-        self.table.setColumnCount(len(table_headers))
+        # ----- Table view -----
+        self.node_model = DetectedNodeModel(self.db)
+        self.table = QTableView()
+        self.table.setModel(self.node_model)
         self.table.setSizeAdjustPolicy(QAbstractScrollArea.SizeAdjustPolicy.AdjustToContents)
         self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.table.horizontalHeader().setStretchLastSection(True)
         self.table.verticalHeader().setVisible(True)
         self.table.setAlternatingRowColors(True)
-        self.table.setHorizontalHeaderLabels(table_headers.values())
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.table.verticalHeader().setVisible(False)
         self.table.setFocusPolicy(Qt.FocusPolicy.NoFocus)
         self.table.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
@@ -243,9 +283,13 @@ class MainWindow(QMainWindow):
         settings = QPushButton()
         settings.setText("  SETTINGS  ")
         settings.clicked.connect(self.openSettingsView)
+        stats = QPushButton()
+        stats.setText("  STATS  ")
+        stats.clicked.connect(self.openStatsView)
         self.tableActionsLayout.addWidget(refresh)
         self.tableActionsLayout.addWidget(camera)
         self.tableActionsLayout.addWidget(settings)
+        self.tableActionsLayout.addWidget(stats)
         self.tableActionsLayout.addStretch()
         self.tableLayout.addLayout(self.tableActionsLayout)
       
@@ -332,6 +376,14 @@ class MainWindow(QMainWindow):
         self.logsLayout.addWidget(machine_response_label, 3, 0)
         self.logsLayout.addWidget(self.machine_response_value, 3, 1)
 
+        # Detection model status
+        model_status_label = QLabel("Model Status: ")
+        self.model_status_value = QLineEdit("LOADING")
+        self.model_status_value.setReadOnly(True)
+        self.model_status_value.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.logsLayout.addWidget(model_status_label, 4, 0)
+        self.logsLayout.addWidget(self.model_status_value, 4, 1)
+
         # ----- Side layout -----
         self.sideLayout = QVBoxLayout()
         self.sideLayout.addWidget(self.detectionControlsGroup)
@@ -359,6 +411,7 @@ class MainWindow(QMainWindow):
         camera.setStyleSheet("QPushButton {background-color:#ffd589; border-radius: 7px; font-size:14px; font-weight:bold;} QPushButton:hover {background-color: #b0f5a4;}")
         refresh.setStyleSheet("QPushButton {background-color:#f5f5a4; border-radius: 7px; font-size:14px; font-weight:bold;} QPushButton:hover {background-color: #b0f5a4;}")
         settings.setStyleSheet("QPushButton {background-color:#f5f5a4; border-radius: 7px; font-size:14px; font-weight:bold;} QPushButton:hover {background-color: #b0f5a4;}")
+        stats.setStyleSheet("QPushButton {background-color:#f5f5a4; border-radius: 7px; font-size:14px; font-weight:bold;} QPushButton:hover {background-color: #b0f5a4;}")
         send_one.setStyleSheet("QPushButton {background-color:#62b4cf; border-radius: 7px; font-size:14px; font-weight:bold;} QPushButton:hover {background-color: #0080ff;}}")
         send_two.setStyleSheet("QPushButton {background-color:#62b4cf; border-radius: 7px; font-size:14px; font-weight:bold;} QPushButton:hover {background-color: #ff1a1a;}")
         send_three.setStyleSheet("QPushButton {background-color:#ff6262; border-radius: 7px; font-size:14px; font-weight:bold;} QPushButton:hover {background-color: #ff1a1a;}")
@@ -369,8 +422,10 @@ class MainWindow(QMainWindow):
         total_label.setStyleSheet("QLabel {font-size:14px;background-color: #aef3ae}")
         count_label.setStyleSheet("QLabel {font-size:14px; background-color: #aef3ae}")
         machine_response_label.setStyleSheet("QLabel {font-size:14px; background-color: #aef3ae}")
+        model_status_label.setStyleSheet("QLabel {font-size:14px; background-color: #aef3ae}")
         
         self.machine_response_value.setStyleSheet("border-radius: 6px;background-color:white")
+        self.model_status_value.setStyleSheet("border-radius: 6px;background-color:white")
         self.total_value.setStyleSheet("border-radius: 6px;background-color:white")
         self.serial_port_value.setStyleSheet("border-radius: 6px;background-color:white")
         self.count_value.setStyleSheet("border-radius: 6px;background-color:white")
@@ -406,6 +461,9 @@ class MainWindow(QMainWindow):
             self.camera_view.setDetectionStatus('OFF')
             self.detection.isActive = False
             self.resetCount(initial=0)
+            # Tracks frozen while stopped could absorb a node in the band on the next START
+            if self.detection.detector is not None:
+                self.detection.detector.reset_tracker = True
             # try:
             #     self.ser_com.write((2).to_bytes(1, 'little')) # Send integer data 0x02 to Arduino
             # except serial.PortNotOpenError:
@@ -415,101 +473,55 @@ class MainWindow(QMainWindow):
             # except serial.SerialException:
             #     logging.error("Failed to send data. Not port detected.")
 
+    # Send a command code to the Arduino through the serial port
+    def sendData(self, code):
+        return sendCommand(getattr(self, "ser_com", None), code)
+
     # Send data one through serial function
     def sendDataOne(self):
-        try:
-            self.ser_com.write((1).to_bytes(1, 'little')) # Send integer data 0x01 to Arduino
-        except serial.PortNotOpenError:
-            logging.error("Failed to send data. Not port detected.")
-        except AttributeError:
-            logging.error("Failed to send data. Not port detected.")
-        except serial.SerialException:
-            logging.error("Failed to send data. Not port detected.")
+        self.sendData(CUT) # Send integer data 0x01 to Arduino
 
     # Send data two through serial function (on conveyor)
     def sendDataTwo(self):
-        try:
-            self.ser_com.write((2).to_bytes(1, 'little')) # Send integer data 0x02 to Arduino
-        except serial.PortNotOpenError:
-            logging.error("Failed to send data. Not port detected.")
-        except AttributeError:
-            logging.error("Failed to send data. Not port detected.")
-        except serial.SerialException:
-            logging.error("Failed to send data. Not port detected.")
+        self.sendData(CONVEYOR_ON) # Send integer data 0x02 to Arduino
 
     # Send data three through serial function (off conveyor)
     def sendDataThree(self):
-        try:
-            self.ser_com.write((3).to_bytes(1, 'little')) # Send integer data 0x03 to Arduino
-        except serial.PortNotOpenError:
-            logging.error("Failed to send data. Not port detected.")
-        except AttributeError:
-            logging.error("Failed to send data. Not port detected.")
-        except serial.SerialException:
-            logging.error("Failed to send data. Not port detected.")
+        self.sendData(CONVEYOR_OFF) # Send integer data 0x03 to Arduino
 
     # Refresh table function
+    # The model drops its rows and the view fetches them again page by page
     def refreshTable(self):
-        detected_nodes = self.db.getall()
-        total = self.db.total()
-        self.table.setRowCount(total)
-        for nrow in range(total):
-            node = detected_nodes[nrow]
-            data = str(node.data)
-            date = node.date_time.strftime('%b %d, %Y')
-            time = node.date_time.strftime('%H:%M:%S')
-            count_thresh = str(node.count_thresh)
-            data_tableitem = QTableWidgetItem(data)
-            data_tableitem.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            date_tableitem = QTableWidgetItem(date)
-            date_tableitem.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            time_tableitem = QTableWidgetItem(time)
-            time_tableitem.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            count_thresh_tableitem = QTableWidgetItem(count_thresh)
-            count_thresh_tableitem.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.table.setItem(nrow, 0, data_tableitem)
-            self.table.setItem(nrow, 1, date_tableitem)
-            self.table.setItem(nrow, 2, time_tableitem)
-            self.table.setItem(nrow, 3, count_thresh_tableitem)
+        self.node_model.reload()
         self.updateTotal()
 
     # Update label value for the total number of rows in the database
     def updateTotal(self):
-        total = self.db.total() # Get the total number of rows in the database
-        self.total_value.setText(str(total)) # Update total_value label
+        self.total = self.db.total() # Get the total number of rows in the database, including the rows still being written
+        self.total_value.setText(str(self.total)) # Update total_value label
         
-    def getCount(self, count):
-        if count > 0:
-            if self.conveyor_init == False:
-                self.sendDataTwo()
-                self.conveyor_init = True
-        else:
-            if self.conveyor_init == True:
-                self.sendDataThree()
-            self.conveyor_init = False
-        # If the number of detected nodes reaches its conditions
-        if count % (self.config.getint("DETECTION", "COUNT_THRESH")+1) == 0 and count != 0:
-            if self.saved_once == False:
-                try:
-                    self.ser_com.write((1).to_bytes(1, 'little')) # Send integer data 0x01 to Arduino
-                except AttributeError:
-                    logging.error("Failed to send data. Not port detected.")
-                data = self.db.total() + 1 # Overall total
-                date_time = datetime.now() # Record date and time
-                self.db.add(data=data, date_time=date_time, count_thresh=self.config.getint("DETECTION", "COUNT_THRESH")) # Add new row in the database
-                self.refreshTable() # Refresh the table
-                self.saved_once = True # Set saved_once to True to perform tasks once
-                self.resetCount(initial=1)
-        else:
-            if self.saved_once == True:
-                self.saved_once = False 
+    def getCount(self, count, timestamp):
+        self.counter.update(count, timestamp)
         self.count_value.setValue((count/(self.config.getint("DETECTION", "COUNT_THRESH")))*100)
         self.count_value.setFormat("{}/{}".format(count, self.config.getint("DETECTION", "COUNT_THRESH")))
         # self.count_value.setText(str(count))
 
+    # Save a bundle in the database
+    # Only the new row is appended to the table and the cached total is bumped,
+    # the full reload happens when REFRESH is pressed
+    def saveNode(self):
+        data = self.total + 1 # Overall total
+        date_time = datetime.now() # Record date and time
+        count_thresh = self.config.getint("DETECTION", "COUNT_THRESH")
+        self.db.add(data=data, date_time=date_time, count_thresh=count_thresh) # Add new row in the database
+        self.node_model.appendNode((data, date_time, count_thresh))
+        self.total = data
+        self.total_value.setText(str(self.total))
+
     # Reset the count value
     def resetCount(self, initial=0):
-        self.detection.detector.count = initial
-        self.count_value.setValue((self.detection.detector.count/(self.config.getint("DETECTION", "COUNT_THRESH")))*100)
-        self.count_value.setFormat("{}/{}".format(self.detection.detector.count, self.config.getint("DETECTION", "COUNT_THRESH")))
+        if self.detection.detector is not None:
+            self.detection.detector.count = initial
+        self.count_value.setValue((initial/(self.config.getint("DETECTION", "COUNT_THRESH")))*100)
+        self.count_value.setFormat("{}/{}".format(initial, self.config.getint("DETECTION", "COUNT_THRESH")))
         # self.count_value.setText(str(self.detection.detector.count))
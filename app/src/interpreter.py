@@ -0,0 +1,89 @@
+from .constants import *
+import numpy as np
+import logging
+import json
+import time
+import os
+
+try:
+    from tflite_runtime.interpreter import Interpreter, load_delegate
+    try:
+        from tflite_runtime.interpreter import OpResolverType
+    except ImportError:
+        OpResolverType = None
+except ImportError:
+    logging.error("Encountered importing tflite\nTrying to import tensorflow")
+    try:
+        from tensorflow import lite
+        Interpreter = lite.Interpreter
+        load_delegate = lite.experimental.load_delegate
+        OpResolverType = getattr(lite.experimental, "OpResolverType", None)
+    except ImportError:
+        print("Encountered importing tensorflow")
+        exit(1)
+
+# Create the TFLite interpreter.
+# num_threads is the number of CPU threads used by the kernels.
+# delegate is either "xnnpack" (the runtime's built-in XNNPACK delegate), "none" (plain builtin kernels)
+# or the path of an external delegate library (e.g. libedgetpu.so.1).
+def createInterpreter(model_path, num_threads=1, delegate="xnnpack"):
+    kwargs = {"model_path": model_path, "num_threads": num_threads}
+    delegate = (delegate or "none").strip()
+    if delegate.lower() == "xnnpack":
+        if OpResolverType is not None:
+            kwargs["experimental_op_resolver_type"] = OpResolverType.AUTO
+    elif delegate.lower() == "none":
+        if OpResolverType is not None:
+            kwargs["experimental_op_resolver_type"] = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+    else:
+        try:
+            kwargs["experimental_delegates"] = [load_delegate(delegate)]
+        except (ValueError, OSError) as error:
+            logging.error("Failed to load delegate {}, using builtin kernels. {}".format(delegate, error))
+    try:
+        interpreter = Interpreter(**kwargs)
+    except TypeError:
+        # Older runtimes do not accept the op resolver type
+        kwargs.pop("experimental_op_resolver_type", None)
+        interpreter = Interpreter(**kwargs)
+    interpreter.allocate_tensors()
+    return interpreter
+
+# Mean invoke() time in seconds of an interpreter fed with a blank input
+def timeInvoke(interpreter, runs=10, warmup=2):
+    input_details = interpreter.get_input_details()[0]
+    interpreter.set_tensor(input_details['index'], np.zeros(input_details['shape'], dtype=input_details['dtype']))
+    for _ in range(warmup):
+        interpreter.invoke()
+    start = time.perf_counter()
+    for _ in range(runs):
+        interpreter.invoke()
+    return (time.perf_counter() - start) / runs
+
+# Find the fastest number of threads on this machine.
+# The result is cached in PROBE_CACHE_NAME, keyed by model, delegate and CPU count,
+# so the probe only runs once per machine and model.
+def probeThreads(model_path, delegate="xnnpack", cache_path=PROBE_CACHE_NAME):
+    cpus = os.cpu_count() or 1
+    key = "{}:{}:{}:{}".format(model_path, os.path.getmtime(model_path), delegate, cpus)
+    try:
+        with open(cache_path, "r") as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        cache = {}
+    if key in cache:
+        return cache[key]
+
+    timings = {}
+    for num_threads in range(1, cpus + 1):
+        timings[num_threads] = timeInvoke(createInterpreter(model_path, num_threads, delegate))
+    best = min(timings, key=timings.get)
+    logging.info("Thread probe (seconds per invoke): {}, using {} threads".format(timings, best))
+
+    cache[key] = best
+    try:
+        with open(cache_path, "w") as cache_file:
+            json.dump(cache, cache_file, indent=4)
+    except OSError as error:
+        logging.error("Failed to write the thread probe cache. {}".format(error))
+    return best
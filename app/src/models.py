@@ -0,0 +1,108 @@
+from PyQt5.QtCore import (
+    Qt, QAbstractTableModel,
+    QModelIndex, QVariant
+)
+
+# Detected Node Table Model Class
+# Virtual model of the detected node history. Rows are fetched from the database in pages
+# when the view scrolls to them (canFetchMore/fetchMore) and cells are only formatted when painted.
+class DetectedNodeModel(QAbstractTableModel):
+
+    headers = ("Data", "Date", "Time", "Threshold")
+
+    # Constructor
+    def __init__(self, db, page_size=200, parent=None):
+        super(DetectedNodeModel, self).__init__(parent)
+        self.db = db
+        self.page_size = page_size
+        self.rows = [] # (data, date_time, count_thresh) tuples
+        self.last_id = 0 # ID of the last fetched row, the next page starts after it
+        self.unsaved = [] # Appended rows the writer may not have committed yet
+        self.exhausted = False
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return QVariant()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        if role != Qt.ItemDataRole.DisplayRole:
+            return QVariant()
+        data, date_time, count_thresh = self.rows[index.row()]
+        column = index.column()
+        if column == 0:
+            return str(data)
+        if column == 1:
+            return date_time.strftime('%b %d, %Y')
+        if column == 2:
+            return date_time.strftime('%H:%M:%S')
+        return str(count_thresh)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return not self.exhausted
+
+    # Load the next page of rows from the database
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        self.pruneUnsaved()
+        page = self.db.page(self.last_id, self.page_size)
+        rows = [row[1:] for row in page]
+        if page:
+            self.last_id = page[-1][0]
+        if self.unsaved:
+            fetched = set(rows)
+            self.unsaved = [row for row in self.unsaved if row not in fetched]
+        if len(page) < self.page_size:
+            # Last page, the rows still waiting for the writer go after it
+            self.exhausted = True
+            rows.extend(self.unsaved)
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    # Append a row that was just saved.
+    # While pages are still to be fetched the row is left to fetchMore, which reaches it in order,
+    # or adds it after the last page if the writer has not committed it by then.
+    def appendNode(self, row):
+        self.unsaved.append(row)
+        self.pruneUnsaved()
+        if not self.exhausted:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows))
+        self.rows.append(row)
+        self.endInsertRows()
+
+    # Keep only the appended rows that may still be uncommitted.
+    # The writer commits in order, so those are the last pending ones.
+    def pruneUnsaved(self):
+        pending = self.db.pending()
+        if pending < len(self.unsaved):
+            self.unsaved = self.unsaved[len(self.unsaved) - pending:]
+
+    # Drop the loaded rows, the view fetches the first page again.
+    # The unsaved rows are kept, they are not in the database yet.
+    def reload(self):
+        self.beginResetModel()
+        self.rows = []
+        self.last_id = 0
+        self.exhausted = False
+        self.endResetModel()
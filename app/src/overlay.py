@@ -0,0 +1,65 @@
+import numpy as np
+import cv2
+
+# Overlay Renderer Class
+# Draws the detection overlay on the frames shown in the camera view.
+# The parts that never change (ROI lines and the status banners) are rendered once into
+# cached layers and pasted with a single masked copy (cv2.copyTo), and the text metrics of the
+# detection labels are cached per label and score (in whole percents).
+class OverlayRenderer:
+
+    # Constructor
+    def __init__(self, imW, imH, roi1, roi2, labels):
+        self.imW = imW
+        self.imH = imH
+        self.roi1 = roi1
+        self.roi2 = roi2
+        self.labels = labels
+        self.label_metrics = {}
+
+        # Static layer for each detection status
+        self.layers = {
+            True: self.staticLayer("NODE  DETECTED", (255,255,110)),
+            False: self.staticLayer("INVALID!  NOT NODE", (0,0,255))
+        }
+
+    # Render the ROI lines and a banner into a layer and its mask.
+    # The mask comes from an alpha channel drawn with the same calls, so anti-aliased text keeps clean edges.
+    def staticLayer(self, banner, color):
+        layer = np.zeros((self.imH, self.imW, 3), dtype=np.uint8)
+        alpha = np.zeros((self.imH, self.imW), dtype=np.uint8)
+        for image, line_color, banner_color in ((layer, (0, 0xFF, 0), color), (alpha, 255, 255)):
+            # Draw ROI line for counting.
+            cv2.line(image, (self.roi1, 0), (self.roi1, self.imH), line_color, 5)
+            cv2.line(image, (self.roi2, 0), (self.roi2, self.imH), line_color, 5)
+            cv2.putText(image, banner, (30,self.imH-30), cv2.FONT_HERSHEY_SIMPLEX, 1.8, banner_color, 4, cv2.LINE_AA)
+        return layer, np.where(alpha >= 128, 255, 0).astype(np.uint8)
+
+    # Label text and its size for a detection, computed once per label and score
+    def labelMetrics(self, class_id, score):
+        key = (class_id, int(score*100))
+        metrics = self.label_metrics.get(key)
+        if metrics is None:
+            object_name = self.labels[class_id] # Look up object name from "labels" array using class index
+            label = '%s: %d%%' % (object_name, key[1]) # Example: 'person: 72%'
+            labelSize, baseLine = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2) # Get font size
+            metrics = self.label_metrics[key] = (label, labelSize, baseLine)
+        return metrics
+
+    # Draw the overlay on the frame (in place)
+    def draw(self, frame, detections, detected):
+
+        # Paste the ROI lines and the status banner
+        layer, mask = self.layers[bool(detected)]
+        cv2.copyTo(layer, mask, frame) # Writes into frame, much faster than np.copyto with a broadcast mask
+
+        # Draw detection box and label of every detection in between the ROI lines
+        for detection in detections:
+            xmin, ymin, xmax, ymax = int(detection["xmin"]), int(detection["ymin"]), int(detection["xmax"]), int(detection["ymax"])
+            cv2.rectangle(frame, (xmin,ymin), (xmax,ymax), (10, 255, 0), 2)
+
+            # Draw label
+            label, labelSize, baseLine = self.labelMetrics(int(detection["class_id"]), float(detection["score"]))
+            label_ymin = max(ymin, labelSize[1] + 10) # Make sure not to draw label too close to top of window
+            cv2.rectangle(frame, (xmin, label_ymin-labelSize[1]-10), (xmin+labelSize[0], label_ymin+baseLine-10), (255, 255, 255), cv2.FILLED) # Draw white box to put label text in
+            cv2.putText(frame, label, (xmin, label_ymin-7), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2) # Draw label text
@@ -0,0 +1,167 @@
+import threading
+import logging
+
+# Returned by a work function when its input is exhausted (e.g. the end of a recording).
+# The stage passes it downstream and stops, and so does every following stage.
+END_OF_STREAM = object()
+
+# Single slot queue between two pipeline stages.
+# A put on a full slot replaces the waiting item (the newest item always wins)
+# and the replaced item is counted as dropped.
+class SlotQueue:
+
+    # Constructor
+    def __init__(self, name):
+        self.name = name
+        self.item = None
+        self.full = False
+        self.closed = False
+        self.puts = 0
+        self.drops = 0
+        self.condition = threading.Condition()
+
+    # Put an item in the slot, dropping the one that is still waiting
+    def put(self, item):
+        with self.condition:
+            if self.full:
+                self.drops += 1
+            self.item = item
+            self.full = True
+            self.puts += 1
+            self.condition.notify_all()
+
+    # Take the item from the slot, returns None on timeout or when closed
+    def get(self, timeout=None):
+        with self.condition:
+            if not self.full and not self.closed:
+                self.condition.wait(timeout)
+            if not self.full:
+                return None
+            item = self.item
+            self.item = None
+            self.full = False
+            self.condition.notify_all()
+            return item
+
+    # Wait until the waiting item is taken, returns False on timeout
+    def drain(self, timeout=None):
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.full or self.closed, timeout)
+
+    # Wake up every consumer waiting on the slot
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    # Number of items waiting in the slot (0 or 1)
+    def depth(self):
+        return 1 if self.full else 0
+
+    def stats(self):
+        return {"depth": self.depth(), "puts": self.puts, "drops": self.drops}
+
+
+# Pipeline stage running its own thread.
+# It takes an item from the inbox, hands it to the work function and puts the
+# result in the outbox. A stage without inbox is a source (the work function
+# is called with None) and a stage without outbox is a sink.
+# An exception from the work function is logged and stops the stage, failed is then called with the stage.
+class Stage(threading.Thread):
+
+    # Constructor
+    def __init__(self, name, work, inbox=None, outbox=None, timeout=0.5, failed=None):
+        super(Stage, self).__init__(name=name, daemon=True)
+        self.work = work
+        self.inbox = inbox
+        self.outbox = outbox
+        self.timeout = timeout
+        self.failed = failed
+        self.error = None
+        self.processed = 0
+        self.running = threading.Event()
+
+    def run(self):
+        self.running.set()
+        while self.running.is_set():
+            item = None
+            if self.inbox is not None:
+                item = self.inbox.get(self.timeout)
+                if item is None:
+                    continue
+                if item is END_OF_STREAM:
+                    self.end()
+                    break
+            try:
+                result = self.work(item)
+            except Exception as error:
+                self.error = error
+                logging.error("Pipeline stage {} failed. {}".format(self.name, error), exc_info=True)
+                self.running.clear()
+                if self.failed is not None:
+                    self.failed(self)
+                break
+            if result is END_OF_STREAM:
+                self.end()
+                break
+            self.processed += 1
+            if self.outbox is not None and result is not None:
+                self.outbox.put(result)
+
+    # Pass the end of stream downstream and stop.
+    # The last item is left to be taken first, so the end of stream never replaces it.
+    def end(self):
+        if self.outbox is not None:
+            self.outbox.drain()
+            self.outbox.put(END_OF_STREAM)
+        self.running.clear()
+
+    def stop(self):
+        self.running.clear()
+        if self.inbox is not None:
+            self.inbox.close()
+
+
+# Chain of stages connected by single slot queues
+class Pipeline:
+
+    # Constructor
+    def __init__(self):
+        self.stages = []
+        self.queues = []
+
+    # Append a stage, connecting it to the previous one with a new slot queue
+    def add(self, name, work):
+        inbox = None
+        if self.stages:
+            inbox = SlotQueue(name)
+            self.queues.append(inbox)
+            self.stages[-1].outbox = inbox
+        stage = Stage(name, work, inbox=inbox, failed=lambda stage: self.stop())
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+
+    def join(self, timeout=None):
+        for stage in self.stages:
+            stage.join(timeout)
+
+    # Stages that stopped on an exception
+    def failures(self):
+        return [stage for stage in self.stages if stage.error is not None]
+
+    # Per stage queue depth, drop and processed counts
+    def stats(self):
+        stats = {}
+        for stage in self.stages:
+            stats[stage.name] = {"processed": stage.processed}
+            if stage.inbox is not None:
+                stats[stage.name].update(stage.inbox.stats())
+        return stats
@@ -0,0 +1,50 @@
+import numpy as np
+
+# Detection record returned by the post-processing stage
+DETECTION_DTYPE = np.dtype([
+    ("xmin", np.int32),
+    ("ymin", np.int32),
+    ("xmax", np.int32),
+    ("ymax", np.int32),
+    ("class_id", np.int32),
+    ("score", np.float32),
+    ("in_roi", np.bool_)
+])
+
+# Boxes of the detections as rows of (xmin, ymin, xmax, ymax)
+def detectionBoxes(detections):
+    return np.stack([detections["xmin"], detections["ymin"], detections["xmax"], detections["ymax"]], axis=1)
+
+# Vectorized post-processing of the raw model outputs.
+# Keeps detections above the confidence threshold, scales the normalized boxes to the frame size,
+# clips them inside the frame and flags the ones whose xmin lies in between the ROI lines.
+# Only the flagged detections are kept when roi_only is True (the tracker needs all of them).
+# When the model only saw a vertical strip of the frame starting at x0 and cropW pixels wide,
+# the boxes are mapped back to full frame coordinates.
+# Returns a structured array of DETECTION_DTYPE.
+def postprocess(boxes, classes, scores, imW, imH, roi1, roi2, threshold, roi_only=True, x0=0, cropW=None):
+    keep = (scores > threshold) & (scores <= 1.0)
+    boxes = boxes[keep]
+    if cropW is None:
+        cropW = imW
+
+    # Interpreter can return coordinates that are outside of image dimensions, force them to be within image
+    coords = np.empty((len(boxes), 4), dtype=np.int32)
+    coords[:, 0] = np.maximum(1, boxes[:, 0] * imH)
+    coords[:, 1] = np.clip(x0 + boxes[:, 1] * cropW, 1, imW)
+    coords[:, 2] = np.minimum(imH, boxes[:, 2] * imH)
+    coords[:, 3] = np.clip(x0 + boxes[:, 3] * cropW, 1, imW)
+
+    # In between ROI (Region of Interest)
+    in_roi = (coords[:, 1] > roi1) & (coords[:, 1] < roi2)
+    selected = in_roi if roi_only else np.ones(len(coords), dtype=bool)
+
+    detections = np.empty(np.count_nonzero(selected), dtype=DETECTION_DTYPE)
+    detections["ymin"] = coords[selected, 0]
+    detections["xmin"] = coords[selected, 1]
+    detections["ymax"] = coords[selected, 2]
+    detections["xmax"] = coords[selected, 3]
+    detections["class_id"] = classes[keep][selected]
+    detections["score"] = scores[keep][selected]
+    detections["in_roi"] = in_roi[selected]
+    return detections
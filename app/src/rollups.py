@@ -0,0 +1,90 @@
+from sqlalchemy.dialects.sqlite import insert
+from .tables import DetectedNode, ProductionRollup
+from datetime import datetime, time, timedelta
+
+PERIODS = ("minute", "hour", "shift", "day")
+
+# Production Rollups Class
+# Keeps the production_rollup table up to date as bundles are written, so throughput over any
+# period is read from a few pre-aggregated rows instead of scanning detected_node.
+# Every batch is aggregated in memory and merged with one upsert per touched period.
+class Rollups:
+
+    # Constructor
+    # shifts maps shift names to their start time of day, a shift lasts until the next one starts.
+    # Gaps between bundles longer than max_interval seconds are line stops and left out of the mean interval.
+    def __init__(self, shifts=None, max_interval=600):
+        self.shifts = sorted((shifts or {"day": time(0, 0)}).items(), key=lambda shift: shift[1])
+        self.max_interval = max_interval
+        self.last = None # Time of the last written bundle
+        self.staged = None # Time of the last bundle of the batch being written
+
+    # Start time and label of the period that contains date_time
+    def periodStart(self, period, date_time):
+        if period == "minute":
+            return date_time.replace(second=0, microsecond=0), ""
+        if period == "hour":
+            return date_time.replace(minute=0, second=0, microsecond=0), ""
+        if period == "day":
+            return date_time.replace(hour=0, minute=0, second=0, microsecond=0), ""
+        # Latest shift start at or before date_time, the last shift of the previous day before the first one
+        day = date_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        for name, start in reversed(self.shifts):
+            shift_start = datetime.combine(day.date(), start, tzinfo=date_time.tzinfo)
+            if shift_start <= date_time:
+                return shift_start, name
+        name, start = self.shifts[-1]
+        return datetime.combine(day.date() - timedelta(days=1), start, tzinfo=date_time.tzinfo), name
+
+    # Add a batch of detected node rows (keyword arguments of DetectedNode) to the rollups, in the session transaction
+    def update(self, session, batch):
+        totals = {}
+        last = self.last
+        for row in sorted(batch, key=lambda row: row["date_time"]):
+            date_time = row["date_time"]
+            interval = (date_time - last).total_seconds() if last is not None else None
+            if interval is not None and not 0 <= interval <= self.max_interval:
+                interval = None
+            last = date_time
+            for period in PERIODS:
+                period_start, label = self.periodStart(period, date_time)
+                total = totals.setdefault((period, period_start), {
+                    "label": label, "bundles": 0, "nodes": 0, "interval_sum": 0.0, "interval_count": 0})
+                total["bundles"] += 1
+                total["nodes"] += row["count_thresh"]
+                total["count_thresh"] = row["count_thresh"]
+                if interval is not None:
+                    total["interval_sum"] += interval
+                    total["interval_count"] += 1
+        self.staged = last
+
+        table = ProductionRollup.__table__
+        for (period, period_start), total in totals.items():
+            statement = insert(table).values(period=period, period_start=period_start, **total)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.period, table.c.period_start],
+                set_={
+                    "bundles": table.c.bundles + statement.excluded.bundles,
+                    "nodes": table.c.nodes + statement.excluded.nodes,
+                    "count_thresh": statement.excluded.count_thresh,
+                    "interval_sum": table.c.interval_sum + statement.excluded.interval_sum,
+                    "interval_count": table.c.interval_count + statement.excluded.interval_count
+                })
+            session.execute(statement)
+
+    # The batch given to update was committed
+    def written(self):
+        self.last = self.staged
+
+    # Build the rollups of every row already in detected_node, used once when the table is new
+    def rebuild(self, session, page_size=1000):
+        after_id = 0
+        while True:
+            rows = session.query(DetectedNode.detected_node_id, DetectedNode.date_time, DetectedNode.count_thresh) \
+                .filter(DetectedNode.detected_node_id > after_id).order_by(DetectedNode.detected_node_id).limit(page_size).all()
+            if not rows:
+                break
+            after_id = rows[-1][0]
+            self.update(session, [{"date_time": date_time, "count_thresh": count_thresh} for _, date_time, count_thresh in rows])
+            self.written()
+        session.commit()
@@ -0,0 +1,234 @@
+import numpy as np
+import logging
+import time
+import os
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+# Frame Source Class
+# Common interface of everything that produces frames, it mimics cv2.VideoCapture
+# (read() returns (ret, frame), release() closes the source) and declares the
+# native resolution and frame rate so the detector geometry follows the source.
+class FrameSource:
+
+    width = 640
+    height = 480
+    fps = 30.0
+    eof = False # Set once read() has no frames left, a camera never ends
+
+    # Constructor
+    # realtime paces read() at the source frame rate, like a camera would
+    def __init__(self, realtime=False):
+        self.realtime = realtime
+        self.next_time = None
+
+    def read(self):
+        raise NotImplementedError
+
+    def release(self):
+        pass
+
+    # Wait until the next frame is due when running in real time
+    def pace(self):
+        if not self.realtime or not self.fps:
+            return
+        now = time.monotonic()
+        if self.next_time is None:
+            self.next_time = now
+        elif self.next_time > now:
+            time.sleep(self.next_time - now)
+        self.next_time = max(self.next_time, now) + 1 / self.fps
+
+    def __repr__(self):
+        return "{}({}x{} @ {:.1f} fps)".format(type(self).__name__, self.width, self.height, self.fps)
+
+
+# Decode a FOURCC code read back from the driver, e.g. 1196444237 -> "MJPG"
+def decodeFourcc(value):
+    value = int(value)
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4))
+
+
+# V4L2 camera, by device index
+class CameraSource(FrameSource):
+
+    # Constructor
+    # backend is an OpenCV capture API name (e.g. "v4l2", "any"), fourcc a four letter pixel format (e.g. "MJPG"),
+    # width, height, fps and buffersize are requested from the driver when given
+    def __init__(self, index=0, backend="any", fourcc=None, width=None, height=None, fps=None, buffersize=None):
+        super(CameraSource, self).__init__(realtime=False) # The device paces itself
+        self.index = index
+        api = getattr(cv2, "CAP_" + backend.strip().upper(), None)
+        if api is None:
+            logging.error("Unknown camera backend {}, using the default one".format(backend))
+            api = cv2.CAP_ANY
+        self.capture = cv2.VideoCapture(index, api)
+        self.configure(fourcc, width, height, fps, buffersize)
+        self.width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)) or self.width
+        self.height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)) or self.height
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or self.fps
+
+    # Request the capture properties and verify what the driver actually accepted.
+    # The pixel format goes first, drivers pick the available resolutions and rates from it.
+    def configure(self, fourcc=None, width=None, height=None, fps=None, buffersize=None):
+        requested = []
+        if fourcc:
+            requested.append((cv2.CAP_PROP_FOURCC, "fourcc", fourcc.strip().upper()))
+        if width:
+            requested.append((cv2.CAP_PROP_FRAME_WIDTH, "width", int(width)))
+        if height:
+            requested.append((cv2.CAP_PROP_FRAME_HEIGHT, "height", int(height)))
+        if fps:
+            requested.append((cv2.CAP_PROP_FPS, "fps", float(fps)))
+        if buffersize:
+            requested.append((cv2.CAP_PROP_BUFFERSIZE, "buffersize", int(buffersize)))
+
+        for prop, name, value in requested:
+            if name == "fourcc":
+                self.capture.set(prop, cv2.VideoWriter_fourcc(*value))
+            else:
+                self.capture.set(prop, value)
+
+        self.accepted = {}
+        for prop, name, value in requested:
+            actual = self.capture.get(prop)
+            if name == "fourcc":
+                actual = decodeFourcc(actual)
+            elif name != "fps":
+                actual = int(actual)
+            self.accepted[name] = actual
+            if actual != value:
+                logging.warning("Camera {} requested {}, driver accepted {}".format(name, value, actual))
+        logging.info("Camera {} configuration: {}".format(self.index, self.accepted))
+
+    def read(self):
+        return self.capture.read()
+
+    def release(self):
+        self.capture.release()
+
+
+# Recorded video file
+class VideoFileSource(FrameSource):
+
+    # Constructor
+    def __init__(self, path, realtime=False, loop=False):
+        super(VideoFileSource, self).__init__(realtime)
+        self.path = path
+        self.loop = loop
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise IOError("Could not open video file {}".format(path))
+        self.width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or self.fps
+
+    def read(self):
+        self.pace()
+        ret, frame = self.capture.read()
+        if ret != True and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read()
+        if ret != True:
+            self.eof = True
+        return ret, frame
+
+    def release(self):
+        self.capture.release()
+
+
+# Directory of images, read in name order
+class ImageDirSource(FrameSource):
+
+    # Constructor
+    def __init__(self, path, fps=30.0, realtime=False, loop=False):
+        super(ImageDirSource, self).__init__(realtime)
+        self.path = path
+        self.loop = loop
+        self.fps = fps
+        self.names = sorted(name for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.names:
+            raise IOError("No images found in {}".format(path))
+        self.position = 0
+        first = cv2.imread(os.path.join(path, self.names[0]))
+        self.height, self.width = first.shape[:2]
+
+    def read(self):
+        self.pace()
+        while True:
+            if self.position >= len(self.names):
+                if not self.loop:
+                    self.eof = True
+                    return False, None
+                self.position = 0
+            frame = cv2.imread(os.path.join(self.path, self.names[self.position]))
+            self.position += 1
+            if frame is not None:
+                return True, frame
+
+
+# Synthetic frames: bright blocks moving across a dark background at a constant speed.
+# It exercises the whole pipeline without a camera or a recording.
+class SyntheticSource(FrameSource):
+
+    # Constructor
+    def __init__(self, width=640, height=480, fps=30.0, realtime=False, speed=8, spacing=160, frames=None):
+        super(SyntheticSource, self).__init__(realtime)
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.speed = speed # Pixels per frame
+        self.spacing = spacing # Pixels between blocks
+        self.frames = frames # Number of frames before the source ends, None for endless
+        self.index = 0
+
+    def read(self):
+        self.pace()
+        if self.frames is not None and self.index >= self.frames:
+            self.eof = True
+            return False, None
+        frame = np.full((self.height, self.width, 3), 40, dtype=np.uint8)
+        offset = (self.index * self.speed) % self.spacing
+        top = self.height // 3
+        for x in range(offset - self.spacing, self.width, self.spacing):
+            cv2.rectangle(frame, (x, top), (x + self.spacing // 4, 2 * top), (200, 220, 200), cv2.FILLED)
+        self.index += 1
+        return True, frame
+
+
+# Open the frame source described by the [SOURCE] section of the config
+#   kind = camera | file | images | synthetic
+#   path = device index, video file or image directory
+# A camera is configured from the [CAMERA] section (backend, fourcc, width, height, fps, buffersize)
+def openSource(config, realtime=True):
+    kind = config.get("SOURCE", "KIND", fallback="camera").strip().lower()
+    path = config.get("SOURCE", "PATH", fallback="0").strip()
+    fps = config.getfloat("SOURCE", "FPS", fallback=30.0)
+    loop = config.getboolean("SOURCE", "LOOP", fallback=False)
+    if kind == "camera":
+        source = CameraSource(int(path),
+                              backend=config.get("CAMERA", "BACKEND", fallback="any"),
+                              fourcc=config.get("CAMERA", "FOURCC", fallback=None),
+                              width=config.get("CAMERA", "WIDTH", fallback=None),
+                              height=config.get("CAMERA", "HEIGHT", fallback=None),
+                              fps=config.get("CAMERA", "FPS", fallback=None),
+                              buffersize=config.get("CAMERA", "BUFFERSIZE", fallback=None))
+    elif kind == "file":
+        source = VideoFileSource(path, realtime=realtime, loop=loop)
+    elif kind == "images":
+        source = ImageDirSource(path, fps=fps, realtime=realtime, loop=loop)
+    elif kind == "synthetic":
+        source = SyntheticSource(config.getint("SOURCE", "WIDTH", fallback=640),
+                                 config.getint("SOURCE", "HEIGHT", fallback=480),
+                                 fps=fps, realtime=realtime)
+    else:
+        raise ValueError("Unknown frame source kind {}".format(kind))
+    logging.info("Frame source: {}".format(source))
+    return source
+
+# Open a recorded video file or image directory for offline use (not paced)
+def openPath(path, fps=30.0):
+    if os.path.isdir(path):
+        return ImageDirSource(path, fps=fps)
+    return VideoFileSource(path)
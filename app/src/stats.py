@@ -0,0 +1,60 @@
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout,
+    QHBoxLayout, QPlainTextEdit,
+    QPushButton, QDesktopWidget
+)
+from PyQt5.QtGui import QIcon
+
+# Stats View Widget Class
+# Shows the per-stage latency histograms and the pipeline queue counters
+class StatsView(QWidget):
+
+    # Constructor
+    def __init__(self, parent=None):
+        super(StatsView, self).__init__(parent)
+        self.setup_Ui()
+
+    # Setup Ui
+    def setup_Ui(self):
+
+        # ----- Window configurations -----
+        self.setWindowTitle("STATS")
+        self.setWindowIcon(QIcon(":/icon.png"))
+
+        # ----- Layouts -----
+        self.vlayout = QVBoxLayout()
+        self.buttonsLayout = QHBoxLayout()
+
+        # ----- Widgets -----
+        self.stats_text = QPlainTextEdit()
+        self.stats_text.setReadOnly(True)
+        self.stats_text.setMinimumSize(560, 280)
+
+        self.btn_refresh = QPushButton()
+        self.btn_refresh.setText("Refresh")
+        self.btn_export = QPushButton()
+        self.btn_export.setText("Export JSON")
+        self.btn_close = QPushButton()
+        self.btn_close.setText("Close")
+
+        self.btn_refresh.setStyleSheet("QPushButton {background-color:#f5f5a4; border-radius: 7px; font-size:14px; font-weight:bold;} QPushButton:hover {background-color: #b0f5a4;}")
+        self.btn_export.setStyleSheet("QPushButton {background-color:#62b4cf; border-radius: 7px; font-size:14px; font-weight:bold;} QPushButton:hover {background-color: #0080ff;}")
+        self.btn_close.setStyleSheet("QPushButton {background-color:#ff6262; border-radius: 7px; font-size:14px; font-weight:bold;} QPushButton:hover {background-color: #ff1a1a;}")
+
+        self.buttonsLayout.addWidget(self.btn_refresh)
+        self.buttonsLayout.addWidget(self.btn_export)
+        self.buttonsLayout.addWidget(self.btn_close)
+        self.vlayout.addWidget(self.stats_text)
+        self.vlayout.addLayout(self.buttonsLayout)
+
+        self.setLayout(self.vlayout)
+        self.resize(self.vlayout.sizeHint())
+
+    def setStats(self, text):
+        self.stats_text.setPlainText(text)
+
+    def center_Ui(self):
+        qtRectangle = self.frameGeometry()
+        centerPoint = QDesktopWidget().availableGeometry().center()
+        qtRectangle.moveCenter(centerPoint)
+        self.move(qtRectangle.topLeft())
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, DateTime
+from sqlalchemy import Column, Integer, Float, String, DateTime
 
 base = declarative_base()
 
@@ -9,18 +9,51 @@ class DetectedNode(base):
     # Name of the Table in the Database
     __tablename__ = "detected_node"
 
+    # IDs are never reused, even after the rows are archived
+    __table_args__ = {"sqlite_autoincrement": True}
+
     # ID (Primary Key)
     detected_node_id = Column(Integer, primary_key=True)
 
     # Data Column
     data = Column(Integer)
 
-    # Date and Time Column
-    date_time = Column(DateTime(timezone=True))
+    # Date and Time Column (indexed for the range queries)
+    date_time = Column(DateTime(timezone=True), index=True)
 
     # Count threshold based on selected user preference
     count_thresh = Column(Integer)
 
     # Displays Columns' Value
     def __repr__(self):
-        return f"DetectedNode(detected_node_id='{self.detected_node_id}')"
\ No newline at end of file
+        return f"DetectedNode(detected_node_id='{self.detected_node_id}')"
+
+
+# Production Rollup Class
+# Bundles saved per minute, hour, shift and day, maintained with every batch of detected nodes
+class ProductionRollup(base):
+
+    # Name of the Table in the Database
+    __tablename__ = "production_rollup"
+
+    # Period ("minute", "hour", "shift" or "day") and its start time (Primary Key)
+    period = Column(String, primary_key=True)
+    period_start = Column(DateTime(timezone=True), primary_key=True)
+
+    # Shift name for the shift period, empty for the others
+    label = Column(String, default="")
+
+    # Number of bundles saved in the period
+    bundles = Column(Integer, default=0)
+
+    # Number of nodes in the bundles (sum of the count thresholds) and the last count threshold used
+    nodes = Column(Integer, default=0)
+    count_thresh = Column(Integer)
+
+    # Sum and number of the intervals between consecutive bundles, in seconds
+    interval_sum = Column(Float, default=0.0)
+    interval_count = Column(Integer, default=0)
+
+    # Displays Columns' Value
+    def __repr__(self):
+        return f"ProductionRollup(period='{self.period}', period_start='{self.period_start}')"
@@ -0,0 +1,121 @@
+import threading
+import json
+import math
+
+# Upper bounds (in milliseconds) of the histogram buckets, the last bucket takes everything above
+BUCKETS_MS = (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+# Exact percentile (nearest rank) of a list of values
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+# Fixed bucket latency histogram.
+# With keep_samples every latency is kept too and the percentiles are exact, for offline runs.
+class Histogram:
+
+    # Constructor
+    def __init__(self, buckets=BUCKETS_MS, keep_samples=False):
+        self.buckets = buckets
+        self.samples = [] if keep_samples else None
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    # Record a latency in seconds
+    def record(self, seconds):
+        ms = seconds * 1000
+        index = 0
+        while index < len(self.buckets) and ms > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        if self.samples is not None:
+            self.samples.append(ms)
+        self.count += 1
+        self.total += ms
+        self.min = ms if self.min is None else min(self.min, ms)
+        self.max = ms if self.max is None else max(self.max, ms)
+
+    # Percentile in milliseconds, exact when the samples are kept,
+    # otherwise approximate (upper bound of the bucket holding it)
+    def percentile(self, q):
+        if self.count == 0:
+            return None
+        if self.samples is not None:
+            return percentile(self.samples, q)
+        rank = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                if index < len(self.buckets):
+                    return min(self.buckets[index], self.max)
+                return self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else None,
+            "min_ms": self.min,
+            "max_ms": self.max,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "exact": self.samples is not None,
+            "buckets_ms": list(self.buckets),
+            "counts": list(self.counts)
+        }
+
+
+# Per stage latency histograms, shared by the detection threads and the GUI
+class Timings:
+
+    # Constructor
+    def __init__(self):
+        self.histograms = {}
+        self.keep_samples = False
+        self.lock = threading.Lock()
+
+    # Record the latency in seconds of a stage
+    def record(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(keep_samples=self.keep_samples)
+            histogram.record(seconds)
+
+    # Drop every histogram, keep_samples applies to the new ones
+    def reset(self, keep_samples=False):
+        with self.lock:
+            self.histograms = {}
+            self.keep_samples = keep_samples
+
+    def snapshot(self):
+        with self.lock:
+            return {stage: histogram.snapshot() for stage, histogram in self.histograms.items()}
+
+    # One line per stage, for display. The percentiles are bucket upper bounds, hence "<="
+    def summary(self):
+        lines = []
+        for stage, stats in self.snapshot().items():
+            lines.append("{}: n={} mean={:.2f}ms p50<={:.2f}ms p95<={:.2f}ms p99<={:.2f}ms max={:.2f}ms".format(
+                stage, stats["count"], stats["mean_ms"], stats["p50_ms"], stats["p95_ms"], stats["p99_ms"], stats["max_ms"]))
+        return "\n".join(lines)
+
+    # Export the histograms as JSON
+    def toJson(self, path=None):
+        text = json.dumps(self.snapshot(), indent=4)
+        if path is not None:
+            with open(path, "w") as json_file:
+                json_file.write(text)
+        return text
+
+
+# Stages: grab, preprocess, invoke, postprocess, draw, qimage, signal
+timings = Timings()
@@ -0,0 +1,169 @@
+from .postprocess import DETECTION_DTYPE, detectionBoxes
+import numpy as np
+
+# Intersection over union of every box of a against every box of b.
+# Boxes are rows of (xmin, ymin, xmax, ymax), the result has shape (len(a), len(b)).
+def iouMatrix(a, b):
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+# IoU Tracker Class
+# Associates the detections of consecutive frames by IoU and gives every node a track ID.
+# A node is counted once, the first time its track has its xmin in between the ROI lines after a real
+# crossing (the track was seen left of the band, or is confirmed by two or more hits),
+# so two boxes in the band or a missed frame no longer cause double or missed counts.
+# Every track also keeps a constant velocity estimate, used to move the boxes on the frames
+# where the model is not run (see predict). Ages are counted in frames, updates and predictions alike,
+# so skipping frames does not keep stale tracks alive longer.
+# The tracks are kept in parallel arrays so the association stays vectorized.
+class IouTracker:
+
+    # Constructor
+    # iou_thresh is the minimum IoU to associate a detection with a track,
+    # max_age the number of frames a track survives without a detection
+    def __init__(self, roi1, roi2, iou_thresh=0.3, max_age=5):
+        self.roi1 = roi1
+        self.roi2 = roi2
+        self.iou_thresh = iou_thresh
+        self.max_age = max_age
+        self.next_id = 0
+        self.reset()
+
+    # Drop every track
+    def reset(self):
+        self.boxes = np.empty((0, 4), dtype=np.float32) # Current box, observed or predicted
+        self.observed = np.empty((0, 4), dtype=np.float32) # Last observed box
+        self.velocities = np.empty((0, 4), dtype=np.float32) # Pixels per second
+        self.stamps = np.empty(0, dtype=np.float64) # Time of the last observation
+        self.ids = np.empty(0, dtype=np.int64)
+        self.ages = np.empty(0, dtype=np.int32) # Frames since the last observation
+        self.visible = np.empty(0, dtype=bool) # Seen in the last update
+        self.hits = np.empty(0, dtype=np.int32)
+        self.entered = np.empty(0, dtype=bool) # Seen left of the ROI band
+        self.counted = np.empty(0, dtype=bool)
+        self.class_ids = np.empty(0, dtype=np.int32)
+        self.scores = np.empty(0, dtype=np.float32)
+
+    # Greedy association by decreasing IoU, returns the matched (track, detection) index arrays.
+    # Tracks without a velocity estimate stay where they were last seen and lag behind by the frames
+    # since then (ages + 1), their IoU gate is divided by that number.
+    def associate(self, boxes):
+        if len(self.boxes) == 0 or len(boxes) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        iou = iouMatrix(self.boxes, boxes)
+        predicted = self.hits >= 2
+        gate = np.where(predicted, self.iou_thresh, self.iou_thresh / (self.ages + 1))
+        candidates = np.argwhere(iou >= gate[:, None])
+        candidates = candidates[np.argsort(-iou[candidates[:, 0], candidates[:, 1]], kind="stable")]
+        used_tracks = np.zeros(len(self.boxes), dtype=bool)
+        used_boxes = np.zeros(len(boxes), dtype=bool)
+        tracks, detections = [], []
+        for track, detection in candidates:
+            if not used_tracks[track] and not used_boxes[detection]:
+                used_tracks[track] = True
+                used_boxes[detection] = True
+                tracks.append(track)
+                detections.append(detection)
+        return np.array(tracks, dtype=np.int64), np.array(detections, dtype=np.int64)
+
+    # Count the given tracks that crossed into the ROI band for the first time.
+    # A track born inside the band (e.g. after a miss) counts only once confirmed.
+    def countCrossing(self, candidates):
+        crossing = candidates & ~self.counted & (self.entered | (self.hits >= 2)) \
+            & (self.boxes[:, 0] > self.roi1) & (self.boxes[:, 0] < self.roi2)
+        self.counted |= crossing
+        return int(np.count_nonzero(crossing))
+
+    # Update the tracks with the detections (DETECTION_DTYPE) found by the model in the frame captured at timestamp.
+    # Returns the number of nodes counted in this frame.
+    def update(self, detections, timestamp):
+        boxes = detectionBoxes(detections).astype(np.float32).reshape(-1, 4)
+        # Match against where the tracks with a velocity estimate should be now, not where they were last seen,
+        # so a missed detection does not leave the track behind a fast node
+        predicted = self.hits >= 2
+        dt = (timestamp - self.stamps[predicted])[:, None]
+        self.boxes[predicted] = self.observed[predicted] + self.velocities[predicted] * dt
+        tracks, matches = self.associate(boxes)
+
+        # Matched tracks take the new box and refine their velocity, the others get older
+        self.ages += 1
+        self.visible[:] = False
+        self.visible[tracks] = True
+        dt = timestamp - self.stamps[tracks]
+        moving = dt > 0
+        velocities = np.zeros((len(tracks), 4), dtype=np.float32)
+        velocities[moving] = (boxes[matches][moving] - self.observed[tracks][moving]) / dt[moving, None]
+        smooth = (self.hits[tracks] >= 2)[:, None]
+        self.velocities[tracks] = np.where(smooth, 0.5 * self.velocities[tracks] + 0.5 * velocities, velocities)
+        self.boxes[tracks] = boxes[matches]
+        self.observed[tracks] = boxes[matches]
+        self.stamps[tracks] = timestamp
+        self.ages[tracks] = 0
+        self.hits[tracks] += 1
+        self.class_ids[tracks] = detections["class_id"][matches]
+        self.scores[tracks] = detections["score"][matches]
+
+        # Unmatched detections start new tracks
+        new = np.ones(len(boxes), dtype=bool)
+        new[matches] = False
+        count = np.count_nonzero(new)
+        self.boxes = np.concatenate([self.boxes, boxes[new]])
+        self.observed = np.concatenate([self.observed, boxes[new]])
+        self.velocities = np.concatenate([self.velocities, np.zeros((count, 4), dtype=np.float32)])
+        self.stamps = np.concatenate([self.stamps, np.full(count, timestamp, dtype=np.float64)])
+        self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + count)])
+        self.ages = np.concatenate([self.ages, np.zeros(count, dtype=np.int32)])
+        self.visible = np.concatenate([self.visible, np.ones(count, dtype=bool)])
+        self.hits = np.concatenate([self.hits, np.ones(count, dtype=np.int32)])
+        self.entered = np.concatenate([self.entered, np.zeros(count, dtype=bool)])
+        self.counted = np.concatenate([self.counted, np.zeros(count, dtype=bool)])
+        self.class_ids = np.concatenate([self.class_ids, detections["class_id"][new]])
+        self.scores = np.concatenate([self.scores, detections["score"][new]])
+        self.next_id += count
+
+        self.entered |= self.visible & (self.boxes[:, 0] <= self.roi1)
+
+        # Forget the tracks that have not been seen for too long
+        self.keep(self.ages <= self.max_age)
+
+        # Count the tracks seen in this frame that reached the ROI band for the first time
+        return self.countCrossing(self.visible)
+
+    # Move the live tracks to their constant velocity position at timestamp, used instead of running the model.
+    # Only tracks with a velocity estimate (two or more hits) move and can be counted, missed ones included.
+    # Returns the number of nodes counted in this frame.
+    def predict(self, timestamp):
+        self.ages += 1
+        moving = (self.hits >= 2) & (self.ages <= self.max_age)
+        dt = (timestamp - self.stamps[moving])[:, None]
+        self.boxes[moving] = self.observed[moving] + self.velocities[moving] * dt
+        return self.countCrossing(moving)
+
+    # Keep only the tracks selected by the mask
+    def keep(self, mask):
+        self.boxes, self.observed, self.velocities = self.boxes[mask], self.observed[mask], self.velocities[mask]
+        self.stamps, self.ids, self.ages, self.hits = self.stamps[mask], self.ids[mask], self.ages[mask], self.hits[mask]
+        self.visible, self.entered = self.visible[mask], self.entered[mask]
+        self.counted, self.class_ids, self.scores = self.counted[mask], self.class_ids[mask], self.scores[mask]
+
+    # Tracks seen in the last update as DETECTION_DTYPE, at their current (possibly predicted) position
+    def detections(self, imW, imH):
+        visible = self.visible
+        boxes = self.boxes[visible]
+        detections = np.empty(len(boxes), dtype=DETECTION_DTYPE)
+        detections["xmin"] = np.clip(boxes[:, 0], 1, imW)
+        detections["ymin"] = np.clip(boxes[:, 1], 1, imH)
+        detections["xmax"] = np.clip(boxes[:, 2], 1, imW)
+        detections["ymax"] = np.clip(boxes[:, 3], 1, imH)
+        detections["class_id"] = self.class_ids[visible]
+        detections["score"] = self.scores[visible]
+        detections["in_roi"] = (detections["xmin"] > self.roi1) & (detections["xmin"] < self.roi2)
+        return detections
@@ -0,0 +1,133 @@
+from sqlalchemy.orm import Session
+from .tables import DetectedNode
+from .timing import timings
+import threading
+import logging
+import queue
+import time
+
+# Database Writer Class
+# Writes the detected nodes on its own thread so that saving never waits for SQLite.
+# Rows are queued by put() and inserted in batches, committing every batch_size rows
+# or batch_interval seconds after the first queued row, whichever comes first.
+class NodesWriter(threading.Thread):
+
+    # Constructor
+    # prepare is called on the writer thread with the session and batch before the commit, to write more in the same transaction,
+    # written is called on the writer thread with every committed batch,
+    # maintain on the writer thread every maintain_interval seconds, in between batches
+    def __init__(self, engine, batch_size=20, batch_interval=0.5, queue_size=1000, prepare=None, written=None,
+                 maintain=None, maintain_interval=3600):
+        super(NodesWriter, self).__init__(name="db-writer", daemon=True)
+        self.engine = engine
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stopping = threading.Event()
+        self.prepare = prepare
+        self.written = written
+        self.maintain = maintain
+        self.maintain_interval = maintain_interval
+        self.next_maintenance = time.monotonic() + maintain_interval
+        self.lock = threading.Lock() # Guards pending, so pending and the written rows never overlap
+        self.pending = 0 # Rows queued or being written
+
+        self.committed = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_commit = 0.0 # Latency of the last commit in seconds
+
+    # Queue a row (keyword arguments of DetectedNode), never blocks.
+    # A full queue means SQLite has been stalled for a long time, the row is dropped and logged.
+    def put(self, row):
+        try:
+            with self.lock:
+                self.queue.put_nowait(row)
+                self.pending += 1
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logging.error("Database writer queue full, dropped row {}".format(row))
+            return False
+
+    def run(self):
+        while not (self.stopping.is_set() and self.queue.empty()):
+            batch = self.collect()
+            if batch:
+                self.commit(batch)
+            if self.maintain is not None and time.monotonic() >= self.next_maintenance:
+                self.next_maintenance = time.monotonic() + self.maintain_interval
+                try:
+                    self.maintain()
+                except Exception as error:
+                    logging.error("Database maintenance failed. {}".format(error))
+
+    # Wait for the first row, then gather more until the batch is full or its time is up
+    def collect(self):
+        try:
+            batch = [self.queue.get(timeout=self.batch_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.stopping.is_set():
+                # On shutdown take what is left without waiting
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    # Insert a batch of rows in one transaction
+    def commit(self, batch):
+        start = time.perf_counter()
+        session = Session(self.engine)
+        try:
+            session.add_all([DetectedNode(**row) for row in batch])
+            if self.prepare is not None:
+                self.prepare(session, batch)
+            session.commit()
+            self.committed += len(batch)
+            self.batches += 1
+            with self.lock:
+                self.pending -= len(batch)
+                if self.written is not None:
+                    self.written(batch)
+        except Exception as error:
+            session.rollback()
+            with self.lock:
+                self.pending -= len(batch)
+            self.failed += len(batch)
+            logging.error("Failed to write {} rows to the database. {}".format(len(batch), error))
+        finally:
+            session.close()
+            for _ in batch:
+                self.queue.task_done()
+        self.last_commit = time.perf_counter() - start
+        timings.record("db_commit", self.last_commit)
+
+    # Wait until every queued row has been written
+    def flush(self):
+        self.queue.join()
+
+    # Write what is left and stop the thread
+    def close(self, timeout=None):
+        self.stopping.set()
+        self.join(timeout)
+
+    def stats(self):
+        return {
+            "depth": self.queue.qsize(),
+            "committed": self.committed,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "last_commit_ms": self.last_commit * 1000
+        }